@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""Benchmark: latency and throughput of the Snoo API client under concurrency.
+
+Runs Snoo and SnooAuthSession against the local FakeSnooApi and reports p50/p99 latency per call
+and throughput for these scenarios:
+
+- sequential: one get_me after another (client overhead on top of the server latency)
+- concurrent: a mix of GET endpoints with many concurrent callers
+- refresh: concurrent callers while the access token keeps expiring (single-flight refresh)
+- errors: concurrent callers while a share of the requests fails with 503 and is retried
+- snapshot: the dashboard requests of Snoo.snapshot() awaited one after another vs. snapshot()
+
+Usage: python benchmarks/api_latency.py [--requests N] [--concurrency C] [--latency SECONDS]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pysnoo import Snoo, RetryPolicy  # noqa: E402 pylint: disable=wrong-import-position
+from fake_snoo_api import FakeSnooApi, FakeSnooAuthSession  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of values"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _calls(snoo: Snoo):
+    """Return the GET calls of the concurrent mix"""
+    return [
+        snoo.get_me,
+        snoo.get_devices,
+        snoo.get_baby,
+        snoo.get_last_session,
+        lambda: snoo.get_aggregated_session(datetime(2021, 2, 1, 7)),
+        lambda: snoo.get_session_total_time('0123456789abcdef01234569'),
+    ]
+
+
+async def run_scenario(name, api: FakeSnooApi, requests: int, concurrency: int, token_expires_in=None,
+                       retry_policy=RetryPolicy()):
+    """Run requests calls with concurrency callers and print a result line"""
+    token = api.issue_token(token_expires_in)
+    latencies = []
+    failures = 0
+    api.stats.clear()
+
+    async with FakeSnooAuthSession(api.url, token, lambda _: None, retry_policy=retry_policy) as session:
+        snoo = Snoo(session)
+        calls = _calls(snoo) if concurrency > 1 else [snoo.get_me]
+        queue = list(range(requests))
+
+        async def caller():
+            nonlocal failures
+            while queue:
+                index = queue.pop()
+                start = time.perf_counter()
+                try:
+                    await calls[index % len(calls)]()
+                except Exception:  # pylint: disable=broad-except
+                    failures += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(caller() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print('{:<12} {:>8} {:>8.0f} {:>9.1f} {:>9.1f} {:>8} {:>8} {:>9}'.format(
+        name, len(latencies), len(latencies) / elapsed,
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000,
+        failures, api.stats['errors'], api.stats['refreshes']))
+
+
+async def run_snapshot(api: FakeSnooApi, repeats: int):
+    """Compare awaiting the snapshot requests one after another with Snoo.snapshot()"""
+    async with FakeSnooAuthSession(api.url, api.issue_token(), lambda _: None) as session:
+        snoo = Snoo(session)
+
+        async def sequential():
+            await snoo.get_me()
+            await snoo.get_devices()
+            baby = await snoo.get_baby()
+            await snoo.get_last_session()
+            await snoo.get_session_total_time(baby.baby)
+
+        for name, call in (('sequential', sequential), ('snapshot', snoo.snapshot)):
+            latencies = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                await call()
+                latencies.append(time.perf_counter() - start)
+            print('{:<12} {:>8} {:>9.1f} {:>9.1f}'.format(
+                name, repeats, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000))
+
+
+async def async_main(args):
+    """Run all scenarios"""
+    async with FakeSnooApi(latency=args.latency, latency_jitter=args.latency / 2, seed=1) as api:
+        print('Server latency: {:.1f}-{:.1f} ms, {} requests per scenario'.format(
+            args.latency * 1000, args.latency * 1500, args.requests))
+        print('{:<12} {:>8} {:>8} {:>9} {:>9} {:>8} {:>8} {:>9}'.format(
+            'Scenario', 'Calls', 'Calls/s', 'p50 ms', 'p99 ms', 'Failed', '503s', 'Refreshes'))
+
+        await run_scenario('sequential', api, min(args.requests, 200), 1)
+        await run_scenario('concurrent', api, args.requests, args.concurrency)
+        # Tokens expire every second
+        api.token_expires_in = 1
+        await run_scenario('refresh', api, args.requests * 2, args.concurrency, token_expires_in=1)
+        api.token_expires_in = 10800
+
+        api.error_rate = 0.05
+        await run_scenario('errors', api, args.requests, args.concurrency,
+                           retry_policy=RetryPolicy(backoff_base=0.01))
+        api.error_rate = 0.0
+
+        print()
+        print('{:<12} {:>8} {:>9} {:>9}'.format('Dashboard', 'Calls', 'p50 ms', 'p99 ms'))
+        await run_snapshot(api, 50)
+
+
+def main():
+    """Parse arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description='Snoo API client latency benchmark')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.01, help='Server latency in seconds')
+    asyncio.run(async_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
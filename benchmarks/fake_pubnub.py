@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""Local stand-in for the PubNub service used by SnooPubNub.
+
+Implements the subset of the PubNub REST API that SnooPubNub uses: subscribe long-poll, publish,
+history, heartbeat and leave, for any channel (in particular ActivityState.<serial> and
+ControlCommand.<serial>). Messages are kept in memory per channel. Used by the benchmarks, but can
+also be run on its own.
+
+Point a client at it with point_to(), which sets the PNConfiguration origin and disables TLS.
+
+Usage: python benchmarks/fake_pubnub.py [--port 8090] [--latency 0.0]
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+# PubNub returns at most this many messages per subscribe response
+MAX_MESSAGES_PER_RESPONSE = 100
+
+
+class _Channel:  # pylint: disable=too-few-public-methods
+    """Messages of one channel, ordered by timetoken"""
+    __slots__ = ('timetokens', 'messages')
+
+    def __init__(self):
+        self.timetokens: List[int] = []
+        # (message, publisher uuid)
+        self.messages: List[Tuple[Any, Optional[str]]] = []
+
+
+class FakePubNub:
+    """aiohttp server imitating the PubNub service.
+
+    Subscribe requests with timetoken 0 return the current timetoken right away; all others wait up
+    to subscribe_timeout seconds for messages newer than their timetoken. Every channel keeps the
+    last max_history messages. Publish and history responses are delayed by latency seconds.
+    """
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 subscribe_timeout: float = 280.0,
+                 max_history: int = 100000,
+                 max_messages_per_response: int = MAX_MESSAGES_PER_RESPONSE):
+        self.latency = latency
+        self.subscribe_timeout = subscribe_timeout
+        self.max_history = max_history
+        self.max_messages_per_response = max_messages_per_response
+        self._channels: Dict[str, _Channel] = {}
+        self._last_timetoken = 0
+        # Set and replaced whenever messages arrive, to wake up pending subscribe requests
+        self._new_messages: Optional[asyncio.Event] = None
+        # Requests per endpoint, plus 'messages' (published or injected) and 'delivered'
+        self.stats = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+        self.origin: Optional[str] = None
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/v2/subscribe/{sub_key}/{channels}/0', self._subscribe),
+            web.get('/publish/{pub_key}/{sub_key}/0/{channel}/0/{message:.*}', self._publish),
+            web.get('/v2/history/sub-key/{sub_key}/channel/{channel}', self._history),
+            web.get('/v2/presence/sub-key/{sub_key}/channel/{channels}/heartbeat', self._presence('heartbeat')),
+            web.get('/v2/presence/sub-key/{sub_key}/channel/{channels}/leave', self._presence('leave')),
+            web.get('/time/0', self._time),
+        ])
+
+    def _next_timetoken(self) -> int:
+        """Return a new timetoken (100 ns since the epoch), strictly increasing"""
+        self._last_timetoken = max(int(time.time() * 10000000), self._last_timetoken + 1)
+        return self._last_timetoken
+
+    def inject(self, channel: str, message: Any, publisher: Optional[str] = None) -> int:
+        """Store a message as if it was published to channel and return its timetoken"""
+        return self.inject_many(channel, [message], publisher)[-1]
+
+    def inject_many(self, channel: str, messages: List[Any], publisher: Optional[str] = None) -> List[int]:
+        """Store messages as if they were published to channel and return their timetokens"""
+        stored = self._channels.setdefault(channel, _Channel())
+        timetokens = [self._next_timetoken() for _ in messages]
+        stored.timetokens.extend(timetokens)
+        stored.messages.extend((message, publisher) for message in messages)
+        # Trim in batches, so that storing stays amortized O(1)
+        if len(stored.timetokens) > 2 * self.max_history:
+            del stored.timetokens[:-self.max_history]
+            del stored.messages[:-self.max_history]
+        self.stats['messages'] += len(messages)
+        if self._new_messages is not None:
+            self._new_messages.set()
+            self._new_messages = asyncio.Event()
+        return timetokens
+
+    def messages(self, channel: str) -> List[Any]:
+        """Return the stored messages of channel, oldest first"""
+        stored = self._channels.get(channel)
+        return [message for message, _ in stored.messages] if stored is not None else []
+
+    def _messages_after(self, channels: List[str], timetoken: int):
+        """Return up to max_messages_per_response envelopes of messages newer than timetoken"""
+        streams = []
+        for channel in channels:
+            stored = self._channels.get(channel)
+            if stored is None:
+                continue
+            start = bisect_right(stored.timetokens, timetoken)
+            end = min(len(stored.timetokens), start + self.max_messages_per_response)
+            streams.append([(stored.timetokens[index], channel, stored.messages[index])
+                            for index in range(start, end)])
+        if len(streams) == 1:
+            return streams[0]
+        merged = heapq.merge(*streams, key=lambda item: item[0])
+        return [item for item, _ in zip(merged, range(self.max_messages_per_response))]
+
+    async def _subscribe(self, request):
+        self.stats['subscribe'] += 1
+        sub_key = request.match_info['sub_key']
+        channels = request.match_info['channels'].split(',')
+        timetoken = int(request.query.get('tt', '0'))
+
+        if timetoken == 0:
+            # Handshake
+            items = []
+            timetoken = self._last_timetoken or self._next_timetoken()
+        else:
+            items = self._messages_after(channels, timetoken)
+            deadline = time.monotonic() + self.subscribe_timeout
+            while not items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._new_messages.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                items = self._messages_after(channels, timetoken)
+            if items:
+                timetoken = items[-1][0]
+
+        self.stats['delivered'] += len(items)
+        return web.json_response({
+            't': {'t': str(timetoken), 'r': 1},
+            'm': [{
+                'a': '1',
+                'b': channel,
+                'c': channel,
+                'd': message,
+                'f': 0,
+                'i': publisher,
+                'k': sub_key,
+                'p': {'t': str(message_timetoken), 'r': 1},
+            } for message_timetoken, channel, (message, publisher) in items],
+        })
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _publish(self, request):
+        self.stats['publish'] += 1
+        try:
+            message = json.loads(request.match_info['message'])
+        except ValueError:
+            return web.json_response([0, 'Invalid JSON', '0'], status=400)
+        await self._delay()
+        timetoken = self.inject(request.match_info['channel'], message, request.query.get('uuid'))
+        return web.json_response([1, 'Sent', str(timetoken)])
+
+    async def _history(self, request):
+        """History of a channel; start is exclusive, end inclusive, pages are in chronological order"""
+        self.stats['history'] += 1
+        await self._delay()
+        stored = self._channels.get(request.match_info['channel'], _Channel())
+        count = min(100, int(request.query.get('count', '100')))
+        first = bisect_left(stored.timetokens, int(request.query['end'])) if 'end' in request.query else 0
+        last = (bisect_left(stored.timetokens, int(request.query['start']))
+                if 'start' in request.query else len(stored.timetokens))
+        if request.query.get('reverse') == 'true':
+            last = min(last, first + count)
+        else:
+            first = max(first, last - count)
+        if first >= last:
+            return web.json_response([[], 0, 0])
+
+        if request.query.get('include_token') == 'true':
+            items = [{'message': stored.messages[index][0], 'timetoken': stored.timetokens[index]}
+                     for index in range(first, last)]
+        else:
+            items = [message for message, _ in stored.messages[first:last]]
+        return web.json_response([items, stored.timetokens[first], stored.timetokens[last - 1]])
+
+    def _presence(self, action):
+        async def handler(_request):
+            self.stats[action] += 1
+            response = {'status': 200, 'message': 'OK', 'service': 'Presence'}
+            if action == 'leave':
+                response['action'] = 'leave'
+            return web.json_response(response)
+        return handler
+
+    async def _time(self, _request):
+        self.stats['time'] += 1
+        return web.json_response([self._next_timetoken()])
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Start serving and return the base URL"""
+        self._new_messages = asyncio.Event()
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.origin = '{}:{}'.format(host, port)
+        self.url = 'http://' + self.origin
+        return self.url
+
+    async def stop(self):
+        """Stop serving"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+def point_to(config, origin: str) -> None:
+    """Send all requests of a PNConfiguration (e.g. SnooPubNub.config) to a FakePubNub origin"""
+    config.origin = origin
+    config.ssl = False
+
+
+async def _serve(args):
+    pubnub = FakePubNub(latency=args.latency)
+    await pubnub.start(port=args.port)
+    print('Serving the fake PubNub service on {}'.format(pubnub.url))
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await pubnub.stop()
+
+
+def main():
+    """Run the fake PubNub service until interrupted"""
+    parser = argparse.ArgumentParser(description='Local stand-in for the PubNub service')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help='Publish and history delay in seconds')
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
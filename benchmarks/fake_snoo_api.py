@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""Local stand-in for the Snoo API (SNOO_API_URI).
+
+Serves the OAuth, user, device, baby and session endpoints from the test fixtures, with
+configurable latency, error rate and token expiry. Used by the benchmarks, but can also be run on
+its own.
+
+Point a client at it with FakeSnooAuthSession, which sends all SNOO_API_URI requests to the local
+server. oauthlib refuses plain HTTP, so the server sets OAUTHLIB_INSECURE_TRANSPORT.
+
+Usage: python benchmarks/fake_snoo_api.py [--port 8080] [--latency 0.05] [--error-rate 0.01]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pysnoo import SnooAuthSession  # noqa: E402 pylint: disable=wrong-import-position
+from pysnoo.const import SNOO_API_URI  # noqa: E402 pylint: disable=wrong-import-position
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+
+def _load_fixture(filename):
+    with open(os.path.join(FIXTURES, filename)) as fdp:
+        return json.load(fdp)
+
+
+class FakeSnooApi:
+    """aiohttp server imitating the Snoo API.
+
+    Every response is delayed by latency seconds plus a uniformly distributed jitter. A share of
+    error_rate of the authenticated requests fails with 503 (and a Retry-After of retry_after
+    seconds, if set). Issued access tokens expire after token_expires_in seconds; requests with an
+    unknown or expired token fail with 401.
+    """
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 retry_after: Optional[float] = None,
+                 token_expires_in: int = 10800,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.token_expires_in = token_expires_in
+        self._random = random.Random(seed)
+        # access token -> expiry (time.time())
+        self._access_tokens: Dict[str, float] = {}
+        self._refresh_tokens = set()
+        # Requests per route, plus 'errors', 'unauthorized', 'logins' and 'refreshes'
+        self.stats = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+        self._baby = _load_fixture('us_v3_me_baby__get_200.json')
+        self._fixtures = {
+            'me': _load_fixture('us_me__get_200.json'),
+            'devices': _load_fixture('ds_me_devices__get_200.json'),
+            'last': _load_fixture('ss_v2_sessions_last__get_200.json'),
+            'aggregated': _load_fixture('ss_v2_sessions_aggregated__get_200.json'),
+            'avg': _load_fixture('ss_v2_babies_sessions_aggregated_avg__get_200.json'),
+            'total': _load_fixture('ss_v2_babies_sessions_total-time__get_200.json'),
+        }
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.add_routes([
+            web.post('/us/login/', self._login),
+            web.post('/us/refresh/', self._refresh),
+            web.get('/us/me/', self._fixture_handler('me')),
+            web.get('/ds/me/devices/', self._fixture_handler('devices')),
+            web.get('/us/v3/me/baby/', self._get_baby),
+            web.patch('/us/v3/me/baby/', self._patch_baby),
+            web.get('/ss/v2/sessions/last/', self._fixture_handler('last')),
+            web.get('/ss/v2/sessions/aggregated/', self._fixture_handler('aggregated')),
+            web.get('/ss/v2/babies/{baby}/sessions/aggregated/avg/', self._fixture_handler('avg')),
+            web.get('/ss/v2/babies/{baby}/sessions/total-time/', self._fixture_handler('total')),
+        ])
+
+    def issue_token(self, expires_in: Optional[int] = None) -> dict:
+        """Return a new valid token, as the login endpoint does"""
+        expires_in = self.token_expires_in if expires_in is None else expires_in
+        access_token = uuid.uuid4().hex
+        refresh_token = uuid.uuid4().hex
+        self._access_tokens[access_token] = time.time() + expires_in
+        self._refresh_tokens.add(refresh_token)
+        return {
+            'access_token': access_token,
+            'expires_in': expires_in,
+            'refresh_token': refresh_token,
+            'scope': 'offline_access',
+            'token_type': 'Bearer',
+            'userId': 'HEX_USER_ID',
+        }
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        resource = request.match_info.route.resource
+        self.stats[resource.canonical if resource is not None else request.path] += 1
+        authenticated = request.path not in ('/us/login/', '/us/refresh/')
+        # The token is checked on arrival, the latency applies to the response.
+        if authenticated:
+            token = request.headers.get('Authorization', '')[len('Bearer '):]
+            expires_at = self._access_tokens.get(token)
+            # Allow for one second of clock skew, as oauthlib rounds expiry times.
+            if expires_at is None or expires_at + 1 < time.time():
+                self.stats['unauthorized'] += 1
+                raise web.HTTPUnauthorized()
+
+        delay = self.latency + self._random.uniform(0, self.latency_jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if authenticated:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats['errors'] += 1
+                headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else None
+                raise web.HTTPServiceUnavailable(headers=headers)
+        return await handler(request)
+
+    def _fixture_handler(self, name):
+        async def handler(_request):
+            return web.json_response(self._fixtures[name])
+        return handler
+
+    async def _login(self, request):
+        body = json.loads(await request.text())
+        if not body.get('username') or not body.get('password'):
+            raise web.HTTPBadRequest()
+        self.stats['logins'] += 1
+        return web.json_response(self.issue_token())
+
+    async def _refresh(self, request):
+        body = json.loads(await request.text())
+        refresh_token = body.get('refresh_token')
+        if refresh_token not in self._refresh_tokens:
+            raise web.HTTPUnauthorized()
+        self.stats['refreshes'] += 1
+        self._refresh_tokens.discard(refresh_token)
+        return web.json_response(self.issue_token())
+
+    async def _get_baby(self, _request):
+        return web.json_response(self._baby)
+
+    async def _patch_baby(self, request):
+        body = await request.json()
+        settings = dict(self._baby['settings'], **body.pop('settings', {}))
+        self._baby = dict(self._baby, settings=settings, **body)
+        return web.json_response(self._baby)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Start serving and return the base URL"""
+        os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = 'http://{}:{}'.format(host, port)
+        return self.url
+
+    async def stop(self):
+        """Stop serving"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+class FakeSnooAuthSession(SnooAuthSession):
+    """SnooAuthSession sending all requests for SNOO_API_URI to a FakeSnooApi"""
+
+    def __init__(self, base_url: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.base_url = base_url
+
+    async def _request(self, method, url, **kwargs):  # pylint: disable=arguments-differ
+        return await super()._request(method, str(url).replace(SNOO_API_URI, self.base_url, 1), **kwargs)
+
+
+async def _serve(args):
+    api = FakeSnooApi(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                      retry_after=args.retry_after, token_expires_in=args.token_expires_in)
+    await api.start(port=args.port)
+    print('Serving the fake Snoo API on {}'.format(api.url))
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await api.stop()
+
+
+def main():
+    """Run the fake Snoo API until interrupted"""
+    parser = argparse.ArgumentParser(description='Local stand-in for the Snoo API')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Response delay in seconds')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='Additional random delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests failing with 503')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After of 503 responses')
+    parser.add_argument('--token-expires-in', type=int, default=10800, help='Access token lifetime in seconds')
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
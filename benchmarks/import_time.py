@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Benchmark: import time of pysnoo and the snoo CLI.
+
+Every scenario runs in a fresh interpreter, repeated a number of times, and the median wall time
+is reported along with the heavy third party packages it imported. With --check, the script exits
+with an error if a plain `import pysnoo` pulls in one of the heavy packages.
+
+Usage: python benchmarks/import_time.py [--repeat N] [--check]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HEAVY_PACKAGES = ('aiohttp', 'oauthlib', 'pubnub')
+
+SCENARIOS = [
+    ('import pysnoo', 'import pysnoo'),
+    ('from pysnoo.models import ActivityState', 'from pysnoo.models import ActivityState'),
+    ('from pysnoo import Snoo', 'from pysnoo import Snoo'),
+    ('from pysnoo import SnooPubNub', 'from pysnoo import SnooPubNub'),
+    # The CLI up to argument parsing, e.g. before sending a command to the daemon
+    ('snoo -h', "import runpy, sys\nsys.argv = ['snoo', '-h']\ntry:\n    runpy.run_path({!r}, run_name='__main__')\n"
+                "except SystemExit:\n    pass".format(os.path.join(ROOT, 'scripts', 'snoo'))),
+]
+
+# Prints the heavy packages imported by the code run before it
+_REPORT = "\nimport sys; print(','.join(p for p in {!r} if p in sys.modules), file=sys.stderr)".format(HEAVY_PACKAGES)
+
+
+def run(code):
+    """Run code in a fresh interpreter, return the wall time in seconds and the heavy packages imported"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code + _REPORT], env=env, check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+
+
+def main():
+    """Run all scenarios and print a table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--check', action='store_true',
+                        help='Fail if `import pysnoo` imports any of: ' + ', '.join(HEAVY_PACKAGES))
+    args = parser.parse_args()
+
+    baseline = statistics.median(run('pass')[0] for _ in range(args.repeat))
+    print('Interpreter startup: {:.1f} ms (subtracted below)'.format(baseline * 1000))
+    print('{:<42} {:>10}  {}'.format('Scenario', 'Import ms', 'Heavy packages'))
+    failed = False
+    for name, code in SCENARIOS:
+        runs = [run(code) for _ in range(args.repeat)]
+        elapsed = statistics.median(elapsed for elapsed, _ in runs) - baseline
+        heavy = runs[-1][1]
+        print('{:<42} {:>10.1f}  {}'.format(name, elapsed * 1000, heavy or '-'))
+        if name == 'import pysnoo' and heavy:
+            failed = True
+
+    if args.check and failed:
+        print('import pysnoo must not import {}'.format(', '.join(HEAVY_PACKAGES)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Benchmark: memory per model instance.
+
+Measures the memory retained per ActivityState (including its nested Signal and StateMachine, but
+excluding the shared Enum members) and per AggregatedSessionItem, as kept in rolling windows of
+activity events or long session histories.
+
+Usage: python benchmarks/model_memory.py [count]
+"""
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pysnoo.models import ActivityState, AggregatedSession  # noqa: E402 pylint: disable=wrong-import-position
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+
+def _load_fixture(filename):
+    with open(os.path.join(FIXTURES, filename)) as fdp:
+        return json.load(fdp)
+
+
+def measure(factory, count):
+    """Return the retained bytes per object created by factory."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # Exclude the list holding the objects
+    retained -= sys.getsizeof(objects)
+    return retained / count
+
+
+def main(count):
+    """Run the benchmark"""
+    activity_state = _load_fixture('pubnub_message_ActivityState.json')
+    aggregated_session = _load_fixture('ss_v2_sessions_aggregated__get_200.json')
+
+    def new_activity_state(i):
+        # Unique timestamps, so that nothing is shared between instances.
+        return ActivityState.from_dict(dict(activity_state, event_time_ms=activity_state['event_time_ms'] + i))
+
+    def new_aggregated_session(_):
+        return AggregatedSession.from_dict(aggregated_session)
+
+    print(f'ActivityState (with Signal, StateMachine): {measure(new_activity_state, count):.0f} bytes/instance')
+    levels = len(aggregated_session['levels'])
+    per_level = measure(new_aggregated_session, count // levels) / levels
+    print(f'AggregatedSessionItem (amortized):         {per_level:.0f} bytes/instance')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
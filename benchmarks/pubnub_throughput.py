@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""Benchmark: streaming throughput and latency of SnooPubNub.
+
+Runs SnooPubNub against the local FakePubNub and reports:
+
+- stream: activity states injected into ActivityState.<serial> at a target rate, received through
+  the subscribe long-poll, decoded and dispatched to a listener reading the event time and state
+  machine. Reported per decoding mode (lazy, eager) and rate: delivered states per second, latency
+  from injection to dispatch and the number of subscribe requests.
+- publish: sequential publishes of control commands to ControlCommand.<serial>
+- history: iter_history over the injected activity states
+
+Usage: python benchmarks/pubnub_throughput.py [--rates 10000 50000 0] [--duration SECONDS]
+(a rate of 0 injects as fast as the loop allows)
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pysnoo import SnooPubNub  # noqa: E402 pylint: disable=wrong-import-position
+from fake_pubnub import FakePubNub, point_to  # noqa: E402 pylint: disable=wrong-import-position
+
+SERIAL_NUMBER = 'SN123456789'
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'pubnub_message_ActivityState.json')
+# Event time of the first injected message. Message n carries EVENT_TIME_BASE + n, to find its injection time.
+EVENT_TIME_BASE = 1612401999588
+# Injection interval in seconds
+TICK = 0.005
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of values"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _load_message() -> dict:
+    with open(FIXTURE) as fdp:
+        return json.load(fdp)
+
+
+async def _connect(fake: FakePubNub, eager_decoding: bool) -> SnooPubNub:
+    pubnub = SnooPubNub('ACCESS_TOKEN', SERIAL_NUMBER, 'benchmark', eager_decoding=eager_decoding)
+    point_to(pubnub.config, fake.origin)
+    await pubnub.subscribe_and_await_connect()
+    return pubnub
+
+
+async def run_stream(fake: FakePubNub, eager_decoding: bool, rate: int, duration: float):
+    """Inject activity states at rate per second for duration seconds and print a result line"""
+    template = _load_message()
+    channel = 'ActivityState.{}'.format(SERIAL_NUMBER)
+    total = int(rate * duration) if rate else int(50000 * duration)
+    injected_at: Dict[int, float] = {}
+    latencies = []
+    done = asyncio.Event()
+
+    def listener(state):
+        # A typical consumer: dispatch on the state machine, log the event time
+        sequence = round(state.event_time.timestamp() * 1000) - EVENT_TIME_BASE
+        _ = state.state_machine.state
+        latencies.append(time.perf_counter() - injected_at[sequence])
+        if len(latencies) == total:
+            done.set()
+
+    pubnub = await _connect(fake, eager_decoding)
+    pubnub.add_listener(listener)
+    subscribes = fake.stats['subscribe']
+    try:
+        start = time.perf_counter()
+        sequence = 0
+        while sequence < total:
+            due = total if not rate else min(total, int((time.perf_counter() - start) * rate) + 1)
+            batch = []
+            now = time.perf_counter()
+            for index in range(sequence, due):
+                batch.append(dict(template, event_time_ms=EVENT_TIME_BASE + index))
+                injected_at[index] = now
+            sequence = due
+            fake.inject_many(channel, batch)
+            await asyncio.sleep(TICK if rate else 0)
+        try:
+            await asyncio.wait_for(done.wait(), max(10.0, duration * 10))
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+    finally:
+        await pubnub.unsubscribe_and_await_disconnect()
+        await pubnub.stop()
+
+    print('{:<8} {:>8} {:>9} {:>10.0f} {:>9.1f} {:>9.1f} {:>10}'.format(
+        'eager' if eager_decoding else 'lazy', rate or 'max', len(latencies), len(latencies) / elapsed,
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000,
+        fake.stats['subscribe'] - subscribes))
+
+
+async def run_publish(fake: FakePubNub, count: int):
+    """Publish count control commands one after another and print a result line"""
+    pubnub = SnooPubNub('ACCESS_TOKEN', SERIAL_NUMBER, 'benchmark')
+    point_to(pubnub.config, fake.origin)
+    latencies = []
+    try:
+        start = time.perf_counter()
+        for _ in range(count):
+            publish_start = time.perf_counter()
+            await pubnub.publish_start()
+            latencies.append(time.perf_counter() - publish_start)
+        elapsed = time.perf_counter() - start
+    finally:
+        await pubnub.stop()
+    assert len(fake.messages('ControlCommand.{}'.format(SERIAL_NUMBER))) >= count
+    print('publish: {} commands, {:.0f}/s, p50 {:.2f} ms, p99 {:.2f} ms'.format(
+        count, count / elapsed, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000))
+
+
+async def run_history(fake: FakePubNub, count: int):
+    """Walk count activity states of the history and print a result line"""
+    pubnub = SnooPubNub('ACCESS_TOKEN', SERIAL_NUMBER, 'benchmark')
+    point_to(pubnub.config, fake.origin)
+    received = 0
+    history = pubnub.iter_history()
+    try:
+        start = time.perf_counter()
+        async for _ in history:
+            received += 1
+            if received == count:
+                break
+        elapsed = time.perf_counter() - start
+    finally:
+        # Cancel the prefetched page before closing the session
+        await history.aclose()
+        await pubnub.stop()
+    print('history: {} states, {:.0f}/s, {} requests'.format(received, received / elapsed, fake.stats['history']))
+
+
+async def async_main(args):
+    """Run all scenarios"""
+    async with FakePubNub() as fake:
+        print('{:<8} {:>8} {:>9} {:>10} {:>9} {:>9} {:>10}'.format(
+            'Decoding', 'Rate', 'Delivered', 'States/s', 'p50 ms', 'p99 ms', 'Subscribes'))
+        for eager_decoding in (False, True):
+            for rate in args.rates:
+                await run_stream(fake, eager_decoding, rate, args.duration)
+        await run_publish(fake, args.publishes)
+        await run_history(fake, args.history)
+
+
+def main():
+    """Parse arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description='SnooPubNub streaming throughput benchmark')
+    parser.add_argument('--rates', type=int, nargs='+', default=[10000, 50000, 0],
+                        help='Injected states per second (0: as fast as possible)')
+    parser.add_argument('--duration', type=float, default=2.0, help='Seconds of injection per rate')
+    parser.add_argument('--publishes', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=10000)
+    asyncio.run(async_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Benchmark: aggregations over the levels of a long session history.
+
+Compares the per-type durations, per-type counts and sleep per day computed from AggregatedSession
+objects with the AggregatedSessionColumns aggregations, for the aggregated sessions of many days.
+Building the objects or columns from the payloads is timed separately.
+
+Usage: python benchmarks/session_aggregates.py [days]
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from pysnoo.const import DATETIME_FMT_AGGREGATED_SESSION  # noqa: E402
+from pysnoo.models import AggregatedSession, AggregatedSessionColumns, SessionItemType  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+
+
+def _payloads(days):
+    """Return the aggregated session payloads of days consecutive days"""
+    with open(os.path.join(FIXTURES, 'ss_v2_sessions_aggregated__get_200.json')) as fdp:
+        payload = json.load(fdp)
+    payloads = []
+    for day in range(days):
+        levels = []
+        for item in payload['levels']:
+            start_time = datetime.strptime(item['startTime'], DATETIME_FMT_AGGREGATED_SESSION) + timedelta(days=day)
+            levels.append(dict(item, startTime=start_time.strftime(DATETIME_FMT_AGGREGATED_SESSION)[:-3]))
+        payloads.append(dict(payload, levels=levels))
+    return payloads
+
+
+def aggregate_objects(sessions):
+    """The aggregations of AggregatedSessionColumns, computed from AggregatedSession objects"""
+    durations = {item_type: timedelta() for item_type in SessionItemType}
+    counts = {item_type: 0 for item_type in SessionItemType}
+    sleep_per_day = {}
+    for session in sessions:
+        for item in session.levels:
+            durations[item.type] += item.state_duration
+            counts[item.type] += 1
+            if item.type == SessionItemType.ASLEEP:
+                day = item.start_time.date()
+                sleep_per_day[day] = sleep_per_day.get(day, timedelta()) + item.state_duration
+    return durations, counts, sleep_per_day
+
+
+def aggregate_columns(columns):
+    """The aggregations of AggregatedSessionColumns"""
+    return columns.duration_by_type(), columns.count_by_type(), columns.duration_per_day()
+
+
+def _best_ms(func, number=5):
+    return min(timeit.repeat(func, number=1, repeat=number)) * 1000
+
+
+def main(days):
+    """Run the benchmark"""
+    payloads = _payloads(days)
+    sessions = [AggregatedSession.from_dict(payload) for payload in payloads]
+    columns = AggregatedSessionColumns.from_dicts(payloads)
+    assert aggregate_objects(sessions) == aggregate_columns(columns)
+
+    print(f'{days} days, {len(columns)} levels')
+    timings = [
+        ('Build AggregatedSession objects', lambda: [AggregatedSession.from_dict(p) for p in payloads]),
+        ('Build AggregatedSessionColumns', lambda: AggregatedSessionColumns.from_dicts(payloads)),
+        ('Aggregate AggregatedSession objects', lambda: aggregate_objects(sessions)),
+        ('Aggregate AggregatedSessionColumns', lambda: aggregate_columns(columns)),
+    ]
+    for name, func in timings:
+        print(f'{name + ":":37} {_best_ms(func):8.1f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
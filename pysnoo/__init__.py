@@ -2,33 +2,130 @@
 
 Contains classes to authenticate against the Happiest Baby API and query various
 entities and expose their functionality.
+
+Submodules are imported on first attribute access, so e.g. the models can be used without
+importing aiohttp, oauthlib or the PubNub SDK.
 """
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .auth_session import SnooAuthSession
+    from .session_pool import SnooAuthSessionPool
+    from .snoo import Snoo
+    from .pubnub import SnooPubNub, SnooPubNubMultiplexer, ActivityStateQueue, OverflowPolicy, DeviceStateCache
+    from .dispatcher import ControlCommandDispatcher, CommandResult, CommandAckTracker
+    from .metrics import LatencyHistogram, HistogramCollector, PrometheusHistogramAdapter
+    from .instrumentation import Instrumentation, InstrumentationEvent, INSTRUMENTATION
+    from .retry import RetryPolicy
+    from .connector import ConnectorConfig
+    from .errors import (SnooError, SnooApiError, SnooAuthenticationError, SnooRateLimitError,
+                         SnooServerError)
+    from .store import AggregatedSessionStore
+    from .journal import ActivityStateJournalWriter, ActivityStateJournalReader
+    from .models import (User,
+                         Device,
+                         Baby,
+                         SSID,
+                         Picture,
+                         Settings,
+                         ResponsivenessLevel,
+                         MinimalLevelVolume,
+                         SoothingLevelVolume,
+                         MinimalLevel,
+                         Sex,
+                         LastSession,
+                         Snapshot,
+                         SessionLevel,
+                         AggregatedSession,
+                         AggregatedSessionItem,
+                         AggregatedSessionColumns,
+                         SessionItemType,
+                         AggregatedSessionAvg,
+                         ActivityState,
+                         LazyActivityState,
+                         AnyActivityState)
 
-from .auth_session import SnooAuthSession
-from .snoo import Snoo
-from .pubnub import SnooPubNub
-from .models import (User,
-                     Device,
-                     Baby,
-                     SSID,
-                     Picture,
-                     Settings,
-                     ResponsivenessLevel,
-                     MinimalLevelVolume,
-                     SoothingLevelVolume,
-                     MinimalLevel,
-                     Sex,
-                     LastSession,
-                     SessionLevel,
-                     AggregatedSession,
-                     AggregatedSessionItem,
-                     SessionItemType,
-                     AggregatedSessionAvg,
-                     ActivityState)
+# Public name -> submodule
+_LAZY_IMPORTS = {
+    'SnooAuthSession': 'auth_session',
+    'SnooAuthSessionPool': 'session_pool',
+    'Snoo': 'snoo',
+    'SnooPubNub': 'pubnub',
+    'SnooPubNubMultiplexer': 'pubnub',
+    'ActivityStateQueue': 'pubnub',
+    'OverflowPolicy': 'pubnub',
+    'DeviceStateCache': 'pubnub',
+    'ControlCommandDispatcher': 'dispatcher',
+    'CommandResult': 'dispatcher',
+    'CommandAckTracker': 'dispatcher',
+    'LatencyHistogram': 'metrics',
+    'HistogramCollector': 'metrics',
+    'PrometheusHistogramAdapter': 'metrics',
+    'Instrumentation': 'instrumentation',
+    'InstrumentationEvent': 'instrumentation',
+    'INSTRUMENTATION': 'instrumentation',
+    'RetryPolicy': 'retry',
+    'ConnectorConfig': 'connector',
+    'SnooError': 'errors',
+    'SnooApiError': 'errors',
+    'SnooAuthenticationError': 'errors',
+    'SnooRateLimitError': 'errors',
+    'SnooServerError': 'errors',
+    'AggregatedSessionStore': 'store',
+    'ActivityStateJournalWriter': 'journal',
+    'ActivityStateJournalReader': 'journal',
+    'User': 'models',
+    'Device': 'models',
+    'Baby': 'models',
+    'SSID': 'models',
+    'Picture': 'models',
+    'Settings': 'models',
+    'ResponsivenessLevel': 'models',
+    'MinimalLevelVolume': 'models',
+    'SoothingLevelVolume': 'models',
+    'MinimalLevel': 'models',
+    'Sex': 'models',
+    'LastSession': 'models',
+    'Snapshot': 'models',
+    'SessionLevel': 'models',
+    'AggregatedSession': 'models',
+    'AggregatedSessionItem': 'models',
+    'AggregatedSessionColumns': 'models',
+    'SessionItemType': 'models',
+    'AggregatedSessionAvg': 'models',
+    'ActivityState': 'models',
+    'LazyActivityState': 'models',
+    'AnyActivityState': 'models'
+}
 
 __all__ = ['SnooAuthSession',
+           'SnooAuthSessionPool',
            'Snoo',
            'SnooPubNub',
+           'SnooPubNubMultiplexer',
+           'ActivityStateQueue',
+           'OverflowPolicy',
+           'DeviceStateCache',
+           'ControlCommandDispatcher',
+           'CommandResult',
+           'CommandAckTracker',
+           'LatencyHistogram',
+           'HistogramCollector',
+           'PrometheusHistogramAdapter',
+           'Instrumentation',
+           'InstrumentationEvent',
+           'INSTRUMENTATION',
+           'RetryPolicy',
+           'ConnectorConfig',
+           'SnooError',
+           'SnooApiError',
+           'SnooAuthenticationError',
+           'SnooRateLimitError',
+           'SnooServerError',
+           'AggregatedSessionStore',
+           'ActivityStateJournalWriter',
+           'ActivityStateJournalReader',
            'User',
            'Device',
            'Baby',
@@ -41,9 +138,28 @@ __all__ = ['SnooAuthSession',
            'MinimalLevel',
            'Sex',
            'LastSession',
+           'Snapshot',
            'SessionLevel',
            'AggregatedSession',
            'AggregatedSessionItem',
+           'AggregatedSessionColumns',
            'SessionItemType',
            'AggregatedSessionAvg',
-           'ActivityState']
+           'ActivityState',
+           'LazyActivityState',
+           'AnyActivityState']
+
+
+def __getattr__(name):
+    """Import public names from their submodule on first access (PEP 562)"""
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    # Cache, so __getattr__ is only called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,15 +1,26 @@
 """PySnoo OAuth Session."""
 
+import asyncio
 import json
-from typing import Callable
+import logging
+from typing import Callable, Optional
 
+import aiohttp
 from oauthlib.oauth2 import LegacyApplicationClient
 
 from .const import (OAUTH_CLIENT_ID,
                     OAUTH_TOKEN_REFRESH_ENDPOINT,
                     OAUTH_LOGIN_ENDPOINT,
-                    BASE_HEADERS)
+                    BASE_HEADERS,
+                    SNOO_API_URI)
+from .connector import ConnectorConfig
 from .oauth2_session import OAuth2Session
+from .retry import NO_RETRY, RetryPolicy
+
+_LOGGER = logging.getLogger(__name__)
+
+# Connections opened by SnooAuthSession.warm_up()
+DEFAULT_WARM_UP_CONNECTIONS = 4
 
 
 class SnooAuthSession(OAuth2Session):
@@ -18,8 +29,28 @@ class SnooAuthSession(OAuth2Session):
     def __init__(
             self,
             token: dict = None,
-            token_updater: Callable[[dict], None] = None) -> None:
-        """Construct a new OAuth 2 client session."""
+            token_updater: Callable[[dict], None] = None,
+            token_renewal_margin: Optional[float] = None,
+            connector: Optional[aiohttp.BaseConnector] = None,
+            retry_policy: Optional[RetryPolicy] = RetryPolicy(),
+            connector_config: Optional[ConnectorConfig] = None) -> None:
+        """Construct a new OAuth 2 client session.
+
+        :param token_renewal_margin: Optionally renew the token in the background
+                                     this many seconds before it expires.
+        :param connector: Optional shared connector. It is not closed together
+                          with this session.
+        :param retry_policy: Retry policy for all requests (e.g. transient 502 or
+                             429 responses). None disables retries.
+        :param connector_config: Connection pool settings of the connector owned
+                                 by this session. aiohttp defaults if None.
+                                 Cannot be combined with connector.
+        """
+        if connector is not None and connector_config is not None:
+            raise ValueError('Pass either a shared connector or a connector_config.')
+        connector_owner = connector is None
+        if connector_config is not None:
+            connector = connector_config.create_connector()
 
         # From Const
         super().__init__(
@@ -31,7 +62,36 @@ class SnooAuthSession(OAuth2Session):
             token=token,
             state=None,
             token_updater=token_updater,
-            headers=BASE_HEADERS)
+            token_renewal_margin=token_renewal_margin,
+            retry_policy=retry_policy,
+            headers=BASE_HEADERS,
+            connector=connector,
+            connector_owner=connector_owner)
+
+    async def warm_up(self, connections: int = DEFAULT_WARM_UP_CONNECTIONS, timeout: float = 10.0) -> int:
+        """Open connections to the Snoo API ahead of the first requests
+
+        Sends concurrent HEAD requests without token, so that the TCP and TLS handshakes happen in
+        parallel, and leaves the connections in the pool for the following requests (as long as
+        they are reused within the keep-alive timeout). Failures are logged, not raised.
+
+        :param connections: Number of connections to open (capped by the connector limits)
+        :param timeout: Seconds per HEAD request
+        :return: Number of successful HEAD requests
+        """
+        async def head() -> bool:
+            try:
+                # Not retried: a failed warm-up only means the first request opens its own connection.
+                async with self.head(SNOO_API_URI + '/', withhold_token=True, allow_redirects=False,
+                                     timeout=aiohttp.ClientTimeout(total=timeout),
+                                     retry_policy=NO_RETRY) as resp:
+                    await resp.read()
+                return True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                _LOGGER.debug('Warm-up request to %s failed: %r', SNOO_API_URI, error)
+                return False
+
+        return sum(await asyncio.gather(*(head() for _ in range(connections))))
 
     async def fetch_token(self, username: str, password: str):  # pylint: disable=arguments-differ
         # Note, Snoo OAuth API is not 100% RFC 6749 compliant. (Wrong Content-Type)
@@ -0,0 +1,39 @@
+"""PySnoo Connector Configuration."""
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+
+
+@dataclass(frozen=True)
+class ConnectorConfig:
+    """Connection pool settings of the aiohttp connector used for the Snoo API.
+
+    All requests go to a single host, so limit_per_host bounds the concurrent requests of a
+    session. Idle connections are kept for keepalive_timeout seconds, so that requests a few
+    seconds apart do not pay a new TCP and TLS handshake. aiohttp does not pipeline HTTP/1.1
+    requests; concurrent requests use concurrent connections instead.
+    """
+    # Total number of connections (0 for no limit)
+    limit: int = 100
+    # Connections per host (0 for no limit)
+    limit_per_host: int = 0
+    # Seconds an idle connection is kept open for reuse
+    keepalive_timeout: float = 60.0
+    # Seconds resolved addresses are cached (forever if None)
+    ttl_dns_cache: Optional[int] = 300
+    # Close every connection after its response instead of keeping it alive
+    force_close: bool = False
+    # Abort TLS connections the server closed without a proper shutdown
+    enable_cleanup_closed: bool = False
+
+    def create_connector(self) -> aiohttp.TCPConnector:
+        """Return a new TCPConnector with these settings"""
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            # aiohttp rejects a keepalive_timeout together with force_close
+            keepalive_timeout=None if self.force_close else self.keepalive_timeout,
+            ttl_dns_cache=self.ttl_dns_cache,
+            force_close=self.force_close,
+            enable_cleanup_closed=self.enable_cleanup_closed)
@@ -0,0 +1,229 @@
+"""PySnoo Control Command Dispatcher."""
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .metrics import DEFAULT_LATENCY_BUCKETS, LatencyHistogram
+from .models import AnyActivityState, EventType
+
+_LOGGER = logging.getLogger(__name__)
+
+GO_TO_STATE = 'go_to_state'
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    """Outcome of a command submitted to a ControlCommandDispatcher"""
+    # The message that was actually published
+    message: Dict[str, Any]
+    # Result of the publish call
+    envelope: Any
+    # True if this command was folded into a later go_to_state command
+    superseded: bool
+    # Seconds from submit until the publish completed
+    latency: float
+    # Seconds the publish call itself took
+    publish_latency: float
+
+
+class _PendingCommand:
+    """A queued command and the futures of all submits folded into it"""
+    # pylint: disable=too-few-public-methods
+
+    __slots__ = ['message', 'submitted_at', 'waiters']
+
+    def __init__(self, message: Dict[str, Any], submitted_at: float, waiter: asyncio.Future):
+        self.message = message
+        self.submitted_at = submitted_at
+        # (submitted_at, future) of every submit, the last one is the current message
+        self.waiters = [(submitted_at, waiter)]
+
+    @property
+    def coalescable(self) -> bool:
+        """Return True if later go_to_state commands may replace this command"""
+        return self.message.get('command') == GO_TO_STATE
+
+
+class ControlCommandDispatcher:
+    """Publishes the commands of a single ControlCommand channel in submit order.
+
+    A go_to_state command is held back for coalesce_window seconds after its submit. A go_to_state
+    submitted in that window replaces it (unset keys such as hold are carried over), so bursts
+    result in a single publish of the last requested state. Other commands are never coalesced and
+    keep their position. At most max_in_flight publishes run concurrently and submit() waits while
+    max_pending commands are queued.
+    """
+
+    def __init__(self,
+                 publish: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 coalesce_window: float = 0.05,
+                 max_in_flight: int = 1,
+                 max_pending: int = 16):
+        """Initialize the dispatcher.
+
+        :param publish: Coroutine function publishing a message to the channel
+        :param coalesce_window: Seconds a go_to_state command waits for superseding commands
+        :param max_in_flight: Maximum number of concurrent publishes
+        :param max_pending: Maximum number of queued, not yet published commands
+        """
+        self._publish = publish
+        self.coalesce_window = coalesce_window
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._pending_slots = asyncio.Semaphore(max_pending)
+        self._pending: Deque[_PendingCommand] = deque()
+        self._worker: Optional[asyncio.Future] = None
+        self._publishes: List[asyncio.Future] = []
+        self._external_listeners: List[Callable[[CommandResult], None]] = []
+
+    def add_listener(self, update_callback: Callable[[CommandResult], None]) -> Callable[[], None]:
+        """Add a CommandResult Listener and returns a remove_listener CB for that listener"""
+        self._external_listeners.append(update_callback)
+
+        def remove_listener_cb() -> None:
+            """Remove listener."""
+            self.remove_listener(update_callback)
+
+        return remove_listener_cb
+
+    def remove_listener(self, update_callback: Callable[[CommandResult], None]) -> None:
+        """Remove data update."""
+        self._external_listeners.remove(update_callback)
+
+    @property
+    def pending(self) -> int:
+        """Return the number of queued, not yet published commands"""
+        return len(self._pending)
+
+    async def submit(self, message: Dict[str, Any]) -> CommandResult:
+        """Queue a command and return its result once it (or the command superseding it) is published"""
+        loop = asyncio.get_event_loop()
+        waiter = loop.create_future()
+        while True:
+            if self._pending and self._pending[-1].coalescable and message.get('command') == GO_TO_STATE:
+                pending = self._pending[-1]
+                _LOGGER.debug('Coalescing %s into %s', pending.message, message)
+                pending.message = {**pending.message, **message}
+                pending.waiters.append((loop.time(), waiter))
+                break
+            if not self._pending_slots.locked():
+                await self._pending_slots.acquire()
+                self._pending.append(_PendingCommand(dict(message), loop.time(), waiter))
+                break
+            # Wait for room, then check for coalescing again
+            await self._pending_slots.acquire()
+            self._pending_slots.release()
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        return await asyncio.shield(waiter)
+
+    async def _run(self):
+        """Worker publishing the queued commands"""
+        loop = asyncio.get_event_loop()
+        while self._pending:
+            command = self._pending[0]
+            if command.coalescable:
+                delay = command.submitted_at + self.coalesce_window - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+            await self._in_flight.acquire()
+            self._pending.popleft()
+            self._pending_slots.release()
+            publish = asyncio.ensure_future(self._send(command))
+            self._publishes.append(publish)
+            publish.add_done_callback(self._publishes.remove)
+
+    async def _send(self, command: _PendingCommand):
+        """Publish a command and resolve its waiters"""
+        loop = asyncio.get_event_loop()
+        try:
+            started_at = loop.time()
+            envelope = await self._publish(command.message)
+            finished_at = loop.time()
+        except Exception as ex:  # pylint: disable=broad-except
+            for _, waiter in command.waiters:
+                if not waiter.done():
+                    waiter.set_exception(ex)
+            return
+        finally:
+            self._in_flight.release()
+
+        last = len(command.waiters) - 1
+        for index, (submitted_at, waiter) in enumerate(command.waiters):
+            result = CommandResult(command.message, envelope, index != last,
+                                   finished_at - submitted_at, finished_at - started_at)
+            _LOGGER.debug('Published %s (superseded: %s) after %.3fs', result.message, result.superseded,
+                          result.latency)
+            for update_callback in self._external_listeners:
+                update_callback(result)
+            if not waiter.done():
+                waiter.set_result(result)
+
+    async def close(self):
+        """Cancel all queued commands and wait for running publishes"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        while self._pending:
+            for _, waiter in self._pending.popleft().waiters:
+                waiter.cancel()
+            self._pending_slots.release()
+        if self._publishes:
+            await asyncio.gather(*self._publishes, return_exceptions=True)
+
+
+class CommandAckTracker:
+    """Matches published commands with their acknowledgement on the activity channel of a device.
+
+    The device acknowledges a command with an activity state of event type COMMAND. Every
+    SnooPubNub has one as ack_tracker and already passes it all activity states, so do not add
+    on_activity_state as listener of that SnooPubNub. Publish-to-ack latencies are recorded in the
+    latency histogram.
+    """
+
+    def __init__(self, serial_number: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.serial_number = serial_number
+        self.latency = LatencyHistogram(buckets)
+        self.timeouts = 0
+        self._waiters: List[Tuple[Callable[[AnyActivityState], bool], asyncio.Future]] = []
+
+    def on_activity_state(self, state: AnyActivityState) -> None:
+        """Resolve all waiters matching state (listener callback)"""
+        if state.event != EventType.COMMAND:
+            return
+        for predicate, waiter in list(self._waiters):
+            if not waiter.done() and predicate(state):
+                waiter.set_result(state)
+
+    async def publish_and_wait(self,
+                               publish: Callable[[], Awaitable[Any]],
+                               predicate: Callable[[AnyActivityState], bool],
+                               timeout: float) -> AnyActivityState:
+        """Call publish and return the first COMMAND activity state matching predicate
+
+        :raises asyncio.TimeoutError: No matching activity state within timeout seconds after publishing
+        """
+        loop = asyncio.get_event_loop()
+        waiter = loop.create_future()
+        # Register before publishing, the acknowledgement can arrive before the publish returns.
+        entry = (predicate, waiter)
+        self._waiters.append(entry)
+        try:
+            started_at = loop.time()
+            await publish()
+            try:
+                state = await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                _LOGGER.warning('No acknowledgement from %s within %ss', self.serial_number, timeout)
+                raise
+            latency = loop.time() - started_at
+        finally:
+            self._waiters.remove(entry)
+        self.latency.observe(latency)
+        _LOGGER.debug('Command acknowledged by %s after %.3fs', self.serial_number, latency)
+        return state
@@ -0,0 +1,49 @@
+"""PySnoo Exceptions."""
+from typing import Optional
+
+from .retry import RetryPolicy
+
+
+class SnooError(Exception):
+    """Base class of all pysnoo errors"""
+
+
+class SnooApiError(SnooError):
+    """The Snoo API answered with an unexpected HTTP status"""
+
+    def __init__(self, status: int, url: str, reason: Optional[str] = None):
+        super().__init__('{} {} ({})'.format(status, reason or '', url))
+        self.status = status
+        self.url = url
+        self.reason = reason
+
+
+class SnooAuthenticationError(SnooApiError):
+    """The Snoo API rejected the credentials or token (401, 403)"""
+
+
+class SnooRateLimitError(SnooApiError):
+    """The Snoo API rate limited the request (429)"""
+
+    def __init__(self, status: int, url: str, reason: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(status, url, reason)
+        # Seconds after which the request may be repeated, if the API said so
+        self.retry_after = retry_after
+
+
+class SnooServerError(SnooApiError):
+    """The Snoo API failed with a server error (5xx)"""
+
+
+def raise_for_status(resp, expected_status: int = 200) -> None:
+    """Raise the SnooApiError matching the status of an aiohttp response, unless it is expected_status"""
+    if resp.status == expected_status:
+        return
+    url = str(resp.url)
+    if resp.status in (401, 403):
+        raise SnooAuthenticationError(resp.status, url, resp.reason)
+    if resp.status == 429:
+        raise SnooRateLimitError(resp.status, url, resp.reason, RetryPolicy.retry_after(resp.headers))
+    if resp.status >= 500:
+        raise SnooServerError(resp.status, url, resp.reason)
+    raise SnooApiError(resp.status, url, resp.reason)
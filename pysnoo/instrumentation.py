@@ -0,0 +1,87 @@
+"""PySnoo Instrumentation."""
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# A request is about to be sent (labels: method, url)
+REQUEST_START = 'request_start'
+# A request got its response headers or failed, including retries and token refresh (labels: method, url,
+# status, error)
+REQUEST_END = 'request_end'
+# An automatic token refresh finished (labels: outcome)
+TOKEN_REFRESH = 'token_refresh'
+# A Snoo API response body was read, parsed and converted into models (labels: endpoint)
+RESPONSE_DECODE = 'response_decode'
+# A PubNub message was decoded by ActivityState.from_dict (eager decoding only; labels: channel)
+ACTIVITY_STATE_DECODE = 'activity_state_decode'
+# An activity state was passed to all listeners of a device (labels: channel, listeners)
+LISTENER_DISPATCH = 'listener_dispatch'
+
+EVENTS = (REQUEST_START, REQUEST_END, TOKEN_REFRESH, RESPONSE_DECODE, ACTIVITY_STATE_DECODE, LISTENER_DISPATCH)
+
+
+@dataclass(frozen=True)
+class InstrumentationEvent:
+    """Timing event passed to instrumentation hooks"""
+    __slots__ = ('name', 'duration', 'labels')
+    name: str
+    # Seconds; None for REQUEST_START
+    duration: Optional[float]
+    labels: Mapping[str, str]
+
+
+class Instrumentation:
+    """Registry of hooks receiving timing events of the request and message hot paths.
+
+    Instrumented code checks hooks[event] before it takes any timestamp, so an event without hooks
+    costs a dict lookup. Hooks are called synchronously with an InstrumentationEvent; exceptions are
+    logged and do not affect the instrumented call.
+    """
+
+    def __init__(self):
+        # Event name -> registered hooks (replaced on change, so emitting never sees a half-updated list)
+        self.hooks: Dict[str, Tuple[Callable[[InstrumentationEvent], None], ...]] = {event: () for event in EVENTS}
+
+    def add_hook(self, event: str, hook: Callable[[InstrumentationEvent], None]) -> Callable[[], None]:
+        """Add a hook for event and return a callback removing it"""
+        if event not in self.hooks:
+            raise ValueError('Event {} is not in {}.'.format(event, EVENTS))
+        self.hooks[event] += (hook,)
+
+        def remove_hook_cb() -> None:
+            """Remove hook."""
+            self.remove_hook(event, hook)
+
+        return remove_hook_cb
+
+    def add_hooks(self, hook: Callable[[InstrumentationEvent], None], events=EVENTS) -> Callable[[], None]:
+        """Add a hook for several events and return a callback removing it from all of them"""
+        remove_callbacks = [self.add_hook(event, hook) for event in events]
+
+        def remove_hooks_cb() -> None:
+            """Remove hook from all events."""
+            for remove_callback in remove_callbacks:
+                remove_callback()
+
+        return remove_hooks_cb
+
+    def remove_hook(self, event: str, hook: Callable[[InstrumentationEvent], None]) -> None:
+        """Remove a hook of event"""
+        hooks = list(self.hooks[event])
+        hooks.remove(hook)
+        self.hooks[event] = tuple(hooks)
+
+    def emit(self, event: str, duration: Optional[float] = None, **labels: str) -> None:
+        """Pass an event to all hooks of event"""
+        instrumentation_event = InstrumentationEvent(event, duration, labels)
+        for hook in self.hooks[event]:
+            try:
+                hook(instrumentation_event)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception('Error in instrumentation hook %s for %s', hook, event)
+
+
+# Registry used by all pysnoo sessions and PubNub clients
+INSTRUMENTATION = Instrumentation()
@@ -0,0 +1,228 @@
+"""PySnoo Activity State Journal.
+
+Activity states are appended to segment files in the journal directory. Every record consists of
+a header with the payload length and event time in epoch milliseconds, followed by the PubNub
+message payload as JSON. Segments are rotated by size and never appended to after a restart, so a
+crash can only truncate the last record of a segment.
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Callable, Iterator, List, Optional
+
+from .models import ActivityState, AnyActivityState, LazyActivityState
+
+_LOGGER = logging.getLogger(__name__)
+
+# Record header: payload length, event_time_ms
+_HEADER = struct.Struct('>Iq')
+_SEGMENT_PREFIX = 'activity-'
+_SEGMENT_SUFFIX = '.journal'
+
+
+def _segment_paths(directory: str) -> List[str]:
+    """Return the paths of all segments in directory, oldest first"""
+    names = sorted(name for name in os.listdir(directory)
+                   if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _dt_to_ms(value: Optional[datetime]) -> Optional[int]:
+    return None if value is None else round(value.timestamp() * 1000)
+
+
+class ActivityStateJournalWriter:
+    """Appends activity states to the segments of a journal directory.
+
+    States are encoded on the event loop, but written, rotated and fsynced by a dedicated writer
+    thread, so that a slow disk does not stall the subscription. Records are fsynced in batches:
+    after fsync_batch records or at the latest fsync_interval seconds after the first unsynced
+    record. Can be registered as listener, e.g. pubnub.add_listener(writer.append).
+    """
+
+    def __init__(self,
+                 directory: str,
+                 segment_size: int = 16 * 1024 * 1024,
+                 fsync_interval: float = 1.0,
+                 fsync_batch: int = 1000):
+        """Initialize the writer.
+
+        :param directory: Journal directory (created if missing)
+        :param segment_size: Rotate to a new segment once a segment reaches this size in bytes
+        :param fsync_interval: Maximum seconds between a write and its fsync
+        :param fsync_batch: Maximum number of records written before an fsync
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        # Never append to existing segments, which may end with a truncated record.
+        self._segment_index = 0
+        existing = _segment_paths(directory)
+        if existing:
+            self._segment_index = int(os.path.basename(existing[-1])[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]) + 1
+        # Only used by the writer thread
+        self._file = None
+        self._file_size = 0
+        # A single thread keeps the records in order.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pysnoo-journal')
+        self._unsynced = 0
+        self._sync_handle = None
+
+    def _submit(self, func, *args) -> Future:
+        """Run func in the writer thread, logging its errors"""
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._log_error)
+        return future
+
+    @staticmethod
+    def _log_error(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            _LOGGER.error('Writing the activity state journal failed', exc_info=future.exception())
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, '{}{:08d}{}'.format(_SEGMENT_PREFIX, self._segment_index, _SEGMENT_SUFFIX))
+        self._segment_index += 1
+        _LOGGER.debug('Opening journal segment %s', path)
+        self._file = open(path, 'ab')
+        self._file_size = 0
+
+    def _write(self, record: bytes) -> None:
+        """Write a record, rotating the segment if needed (writer thread)"""
+        if self._file is not None and self._file_size and self._file_size + len(record) > self.segment_size:
+            self._close_segment()
+        if self._file is None:
+            self._open_segment()
+        self._file.write(record)
+        self._file_size += len(record)
+
+    def _fsync(self) -> None:
+        """Flush and fsync the current segment (writer thread)"""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _close_segment(self):
+        self._fsync()
+        self._file.close()
+        self._file = None
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._close_segment()
+
+    def append(self, state: AnyActivityState) -> None:
+        """Append an activity state to the journal"""
+        message = state.to_message()
+        payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        self._submit(self._write, _HEADER.pack(len(payload), message['event_time_ms']) + payload)
+        self._unsynced += 1
+
+        if self._unsynced >= self.fsync_batch:
+            self._start_sync()
+        elif self._sync_handle is None:
+            self._sync_handle = asyncio.get_event_loop().call_later(self.fsync_interval, self._start_sync)
+
+    def _start_sync(self) -> Optional[Future]:
+        """Queue an fsync of all written records"""
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        if not self._unsynced:
+            return None
+        self._unsynced = 0
+        return self._submit(self._fsync)
+
+    async def sync(self) -> None:
+        """Flush and fsync all written records"""
+        future = self._start_sync()
+        if future is not None:
+            await asyncio.wrap_future(future)
+
+    async def close(self) -> None:
+        """Sync and close the journal"""
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        # Closing the segment fsyncs it.
+        self._unsynced = 0
+        try:
+            await asyncio.wrap_future(self._submit(self._close))
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+class ActivityStateJournalReader:
+    """Replays the activity states of a journal directory to listeners, like a live subscription.
+
+    Segments are memory-mapped and records outside of the requested time range are skipped
+    without decoding their payload.
+    """
+
+    def __init__(self, directory: str, eager_decoding: bool = True):
+        """Initialize the reader.
+
+        :param directory: Journal directory
+        :param eager_decoding: Pass decoded ActivityStates (LazyActivityStates if False)
+        """
+        self.directory = directory
+        self._eager_decoding = eager_decoding
+        self._external_listeners: List[Callable[[AnyActivityState], None]] = []
+
+    def add_listener(self, update_callback: Callable[[AnyActivityState], None]) -> Callable[[], None]:
+        """Add a AcitivyState Listener and returns a remove_listener CB for that listener"""
+        self._external_listeners.append(update_callback)
+        return partial(self.remove_listener, update_callback)
+
+    def remove_listener(self, update_callback: Callable[[AnyActivityState], None]) -> None:
+        """Remove data update."""
+        self._external_listeners.remove(update_callback)
+
+    def iter_range(self,
+                   start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Iterator[AnyActivityState]:
+        """Yield the journaled activity states with start <= event_time < end in journal order"""
+        start_ms = _dt_to_ms(start)
+        end_ms = _dt_to_ms(end)
+        for path in _segment_paths(self.directory):
+            with open(path, 'rb') as segment_file:
+                if os.fstat(segment_file.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as segment:
+                    yield from self._iter_segment(segment, start_ms, end_ms)
+
+    def _iter_segment(self, segment, start_ms, end_ms):
+        offset = 0
+        size = len(segment)
+        while offset + _HEADER.size <= size:
+            length, event_time_ms = _HEADER.unpack_from(segment, offset)
+            offset += _HEADER.size
+            if offset + length > size:
+                _LOGGER.warning('Skipping truncated journal record at offset %d', offset - _HEADER.size)
+                return
+            if (start_ms is None or event_time_ms >= start_ms) and (end_ms is None or event_time_ms < end_ms):
+                message = json.loads(segment[offset:offset + length])
+                if self._eager_decoding:
+                    yield ActivityState.from_dict(message)
+                else:
+                    yield LazyActivityState(message)
+            offset += length
+
+    def replay(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        """Pass the journaled activity states with start <= event_time < end to all listeners
+
+        :return: number of replayed activity states
+        """
+        count = 0
+        for state in self.iter_range(start, end):
+            count += 1
+            for update_callback in self._external_listeners:
+                update_callback(state)
+        return count
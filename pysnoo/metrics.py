@@ -0,0 +1,130 @@
+"""PySnoo Metrics."""
+from bisect import bisect_left
+from typing import Dict, Sequence, Tuple, Union
+
+from .instrumentation import InstrumentationEvent
+
+# Upper bounds in seconds
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Upper bounds in seconds, covering in-process work (decoding, dispatch) as well as requests
+DEFAULT_TIMING_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                          1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Histogram of latencies in seconds with fixed bucket upper bounds (plus an implicit +Inf bucket)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a latency"""
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> Dict[Union[float, str], int]:
+        """Return the number of observations <= each bucket upper bound, keyed by bound and '+Inf'"""
+        result: Dict[Union[float, str], int] = {}
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self._counts):
+            total += count
+            result[bound] = total
+        return result
+
+    def quantile(self, quantile: float) -> float:
+        """Return the upper bound of the bucket containing the quantile (inf if beyond the last bucket)"""
+        if not self.count:
+            return float('nan')
+        rank = quantile * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self._counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        """Return dict from Object"""
+        return {
+            'buckets': self.cumulative_counts(),
+            'count': self.count,
+            'sum': self.sum
+        }
+
+
+class HistogramCollector:
+    """Instrumentation hook keeping a LatencyHistogram per event and label values.
+
+    Only the labels in label_names are kept, to bound the number of histograms (e.g. leave out url).
+    Usage:
+
+        collector = HistogramCollector(label_names=('method', 'status', 'endpoint'))
+        remove_hooks = INSTRUMENTATION.add_hooks(collector)
+        print(collector.exposition())
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_TIMING_BUCKETS, label_names: Sequence[str] = ()):
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        # (event name, ((label, value), ...)) -> histogram
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], LatencyHistogram] = {}
+
+    def __call__(self, event: InstrumentationEvent) -> None:
+        """Record the duration of event (events without duration are ignored)"""
+        if event.duration is None:
+            return
+        labels = tuple((name, str(event.labels[name])) for name in self.label_names if name in event.labels)
+        histogram = self.histograms.get((event.name, labels))
+        if histogram is None:
+            histogram = self.histograms[(event.name, labels)] = LatencyHistogram(self.buckets)
+        histogram.observe(event.duration)
+
+    def exposition(self, prefix: str = 'pysnoo') -> str:
+        """Return all histograms in the Prometheus text exposition format, as <prefix>_<event>_seconds"""
+        lines = []
+        for name in sorted({name for name, _ in self.histograms}):
+            metric = '{}_{}_seconds'.format(prefix, name)
+            lines.append('# TYPE {} histogram'.format(metric))
+            for (event_name, labels), histogram in sorted(self.histograms.items()):
+                if event_name != name:
+                    continue
+                for bound, count in histogram.cumulative_counts().items():
+                    lines.append('{}_bucket{} {}'.format(metric, _format_labels(labels + (('le', str(bound)),)), count))
+                lines.append('{}_sum{} {}'.format(metric, _format_labels(labels), histogram.sum))
+                lines.append('{}_count{} {}'.format(metric, _format_labels(labels), histogram.count))
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in labels) + '}'
+
+
+class PrometheusHistogramAdapter:  # pylint: disable=too-few-public-methods
+    """Instrumentation hook observing event durations in a prometheus_client Histogram.
+
+    label_names must match the labelnames of the histogram; missing labels are observed as ''.
+    Usage:
+
+        histogram = prometheus_client.Histogram('snoo_request_seconds', 'Snoo API requests', ['method', 'status'])
+        INSTRUMENTATION.add_hook(REQUEST_END, PrometheusHistogramAdapter(histogram, ('method', 'status')))
+    """
+
+    def __init__(self, histogram, label_names: Sequence[str] = ()):
+        self.histogram = histogram
+        self.label_names = tuple(label_names)
+
+    def __call__(self, event: InstrumentationEvent) -> None:
+        """Observe the duration of event (events without duration are ignored)"""
+        if event.duration is None:
+            return
+        if self.label_names:
+            self.histogram.labels(*(event.labels.get(name, '') for name in self.label_names)).observe(event.duration)
+        else:
+            self.histogram.observe(event.duration)
@@ -1,18 +1,27 @@
 """PySnoo Data Models."""
-from typing import List, Optional
-from dataclasses import dataclass
+import math
+import re
+from array import array
+from functools import lru_cache
+from itertools import compress, groupby, repeat
+from operator import floordiv, itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+from dataclasses import dataclass, fields
 from datetime import datetime, date, timedelta, timezone
 from enum import Enum
 
 from .const import DATETIME_FMT_AGGREGATED_SESSION
 
 
-# from: https://github.com/ctalkington/python-sonarr/blob/master/sonarr/models.py
-def dt_str_to_dt(dt_str: str) -> datetime:
-    """Convert ISO-8601 datetime string to datetime object."""
-    if dt_str is None:
-        return None
+# Fast path of dt_str_to_dt for the common 'YYYY-MM-DDTHH:MM:SS[.fff...][Z]' shape.
+_DT_STR_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d+))?(Z?)', re.ASCII)
+# Fast path of aggregated_dt_str_to_dt for the DATETIME_FMT_AGGREGATED_SESSION shape.
+_AGGREGATED_DT_STR_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d{1,6})', re.ASCII)
+
 
+# from: https://github.com/ctalkington/python-sonarr/blob/master/sonarr/models.py
+def _dt_str_to_dt_strptime(dt_str: str) -> datetime:
+    """Convert ISO-8601 datetime string to datetime object (strptime reference implementation)."""
     utc = False
 
     if "Z" in dt_str:
@@ -34,6 +43,38 @@ def dt_str_to_dt(dt_str: str) -> datetime:
     return datetime.strptime(dt_str, fmt)
 
 
+@lru_cache(maxsize=1024)
+def dt_str_to_dt(dt_str: str) -> datetime:
+    """Convert ISO-8601 datetime string to datetime object.
+
+    Fractional seconds are truncated to milliseconds. A trailing 'Z' yields an UTC-aware datetime,
+    otherwise the datetime is naive. Results are memoized, as the same timestamps recur frequently.
+    """
+    if dt_str is None:
+        return None
+
+    match = _DT_STR_RE.fullmatch(dt_str)
+    if match is None:
+        # Uncommon shapes (and errors) are handled by strptime.
+        return _dt_str_to_dt_strptime(dt_str)
+
+    year, month, day, hour, minute, second, fraction, utc = match.groups()
+    microsecond = int(fraction[:3].ljust(6, '0')) if fraction else 0
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond,
+                    timezone.utc if utc else None)
+
+
+def aggregated_dt_str_to_dt(dt_str: str) -> datetime:
+    """Convert datetime string in DATETIME_FMT_AGGREGATED_SESSION to a naive datetime object."""
+    match = _AGGREGATED_DT_STR_RE.fullmatch(dt_str)
+    if match is None:
+        return datetime.strptime(dt_str, DATETIME_FMT_AGGREGATED_SESSION)
+
+    year, month, day, hour, minute, second, fraction = match.groups()
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                    int(fraction.ljust(6, '0')))
+
+
 def dt_to_dt_str(dt_value: datetime) -> str:
     """Convert datetime object to ISO-8601 datetime string object."""
     if dt_value is None:
@@ -42,9 +83,26 @@ def dt_to_dt_str(dt_value: datetime) -> str:
     return dt_value.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
 
 
+class _FrozenSlots:
+    """Base of the frozen dataclass models, which use __slots__ to keep instances small.
+
+    Provides the copy and pickle support of frozen slotted dataclasses (builtin from Python 3.10).
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return [getattr(self, field.name) for field in fields(self)]
+
+    def __setstate__(self, state):
+        for field, value in zip(fields(self), state):
+            # Bypass the frozen __setattr__
+            object.__setattr__(self, field.name, value)
+
+
 @dataclass(frozen=True)
-class User:
+class User(_FrozenSlots):
     """Object holding the user information from Snoo."""
+    __slots__ = ('email', 'given_name', 'region', 'surname', 'user_id')
 
     email: str
     given_name: str
@@ -75,8 +133,9 @@ class User:
 
 
 @dataclass(frozen=True)
-class SSID:
+class SSID(_FrozenSlots):
     """Object holding ssid information."""
+    __slots__ = ('name', 'updated_at')
 
     name: str
     updated_at: datetime
@@ -98,8 +157,10 @@ class SSID:
 
 
 @dataclass(frozen=True)
-class Device:
+class Device(_FrozenSlots):
     """Object holding Snoo device information."""
+    __slots__ = ('baby', 'created_at', 'firmware_update_date', 'firmware_version', 'last_provision_success',
+                 'last_ssid', 'serial_number', 'timezone', 'updated_at')
     baby: str  # ID of baby
     created_at: datetime
     firmware_update_date: datetime
@@ -141,8 +202,9 @@ class Device:
 
 
 @dataclass(frozen=True)
-class Picture:
+class Picture(_FrozenSlots):
     """Object holding picture information."""
+    __slots__ = ('id', 'mime', 'encoded', 'updated_at')
 
     id: str  # pylint: disable=invalid-name
     mime: str
@@ -208,8 +270,10 @@ class Sex(Enum):
 
 
 @dataclass(frozen=True)
-class Settings:
+class Settings(_FrozenSlots):
     """Object holding Snoo Settings information."""
+    __slots__ = ('responsiveness_level', 'minimal_level_volume', 'soothing_level_volume', 'minimal_level',
+                 'motion_limiter', 'weaning', 'car_ride_mode', 'offline_lock', 'daytime_start')
 
     responsiveness_level: ResponsivenessLevel
     minimal_level_volume: MinimalLevelVolume
@@ -253,8 +317,10 @@ class Settings:
 
 
 @dataclass(frozen=True)
-class Baby:
+class Baby(_FrozenSlots):
     """Object for Snoo Baby information."""
+    __slots__ = ('baby', 'baby_name', 'birth_date', 'created_at', 'disabled_limiter', 'pictures', 'preemie',
+                 'settings', 'sex', 'updated_at', 'updated_by_user_at')
 
     baby: str  # ID of baby
     baby_name: str
@@ -342,8 +408,9 @@ class SessionItemType(Enum):
 
 
 @dataclass(frozen=True)
-class LastSession:
+class LastSession(_FrozenSlots):
     """Object for Snoo LastSession information."""
+    __slots__ = ('end_time', 'levels', 'start_time')
 
     end_time: datetime
     levels: List[SessionLevel]
@@ -390,8 +457,31 @@ class LastSession:
 
 
 @dataclass(frozen=True)
-class AggregatedSessionItem:
+class Snapshot(_FrozenSlots):
+    """Object holding the account overview returned by Snoo.snapshot()."""
+    __slots__ = ('user', 'devices', 'baby', 'last_session', 'session_total_time')
+
+    user: User
+    devices: List[Device]
+    baby: Baby
+    last_session: LastSession
+    session_total_time: timedelta
+
+    def to_dict(self):
+        """Return dict from Object"""
+        return {
+            "user": self.user.to_dict(),
+            "devices": [device.to_dict() for device in self.devices],
+            "baby": self.baby.to_dict(),
+            "lastSession": self.last_session.to_dict(),
+            "sessionTotalTime": str(self.session_total_time)
+        }
+
+
+@dataclass(frozen=True)
+class AggregatedSessionItem(_FrozenSlots):
     """Object for Snoo AggregatedSessionItem information."""
+    __slots__ = ('is_active', 'session_id', 'start_time', 'state_duration', 'type')
 
     is_active: bool
     session_id: str
@@ -405,7 +495,7 @@ class AggregatedSessionItem:
 
         start_time = data.get("startTime")
         if start_time is not None:
-            start_time = datetime.strptime(start_time, DATETIME_FMT_AGGREGATED_SESSION)
+            start_time = aggregated_dt_str_to_dt(start_time)
 
         return AggregatedSessionItem(
             is_active=data.get("isActive", False),
@@ -427,8 +517,10 @@ class AggregatedSessionItem:
 
 
 @dataclass(frozen=True)
-class AggregatedSession:
+class AggregatedSession(_FrozenSlots):
     """Object for Snoo AggregatedSession information."""
+    __slots__ = ('day_sleep', 'levels', 'longest_sleep', 'naps', 'night_sleep', 'night_wakings', 'timezone',
+                 'total_sleep')
 
     day_sleep: timedelta
     levels: List[AggregatedSessionItem]
@@ -467,6 +559,110 @@ class AggregatedSession:
         }
 
 
+# Ordinal of 1970-01-01, the origin of the columnar epoch seconds.
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class AggregatedSessionColumns:
+    """Columnar representation of the levels of one or more AggregatedSessions.
+
+    Every level is a row across four compact arrays, built straight from the raw JSON without
+    creating an object per level. The arrays support the buffer protocol, so they can be handed to
+    numpy (numpy.frombuffer) without copying.
+
+    - start_time: seconds since 1970-01-01 of the (naive, server-side timezone) level start
+    - state_duration: duration of the level in seconds
+    - type: index of the level's SessionItemType in TYPES
+    - is_active: 1 if the level is still active, else 0
+    """
+
+    TYPES = list(SessionItemType)
+    _TYPE_CODES = {item.value: code for code, item in enumerate(TYPES)}
+    # bytes.translate tables mapping a type code to 1 and all others to 0
+    _TYPE_MASKS = [bytes(int(other == code) for other in range(256)) for code in range(len(TYPES))]
+
+    def __init__(self):
+        """Initialize empty columns."""
+        self.start_time = array('d')
+        self.state_duration = array('d')
+        self.type = array('b')
+        self.is_active = array('b')
+        # Epoch seconds per 'YYYY-MM-DD' prefix, as levels share few distinct days.
+        self._day_seconds: Dict[str, float] = {}
+
+    def __len__(self):
+        return len(self.type)
+
+    @staticmethod
+    def from_dicts(data: Iterable[dict]):
+        """Return columns of the levels of all aggregated session payloads in data."""
+        columns = AggregatedSessionColumns()
+        for session in data:
+            columns.extend(session)
+        return columns
+
+    @staticmethod
+    def from_dict(data: dict):
+        """Return columns of the levels of a single aggregated session payload."""
+        return AggregatedSessionColumns.from_dicts([data])
+
+    def extend(self, data: dict):
+        """Append the levels of an aggregated session payload."""
+        for item in data.get("levels", []):
+            self._append(item)
+
+    def _append(self, item: dict):
+        """Append a single level payload."""
+        start_time = item.get("startTime")
+        match = _AGGREGATED_DT_STR_RE.fullmatch(start_time) if start_time is not None else None
+        if match is None:
+            if start_time is None:
+                seconds = float('nan')
+            else:
+                start_dt = aggregated_dt_str_to_dt(start_time)
+                seconds = ((start_dt.toordinal() - _EPOCH_ORDINAL) * 86400 + start_dt.hour * 3600
+                           + start_dt.minute * 60 + start_dt.second + start_dt.microsecond / 1e6)
+        else:
+            year, month, day, hour, minute, second, fraction = match.groups()
+            day_key = start_time[:10]
+            day_start = self._day_seconds.get(day_key)
+            if day_start is None:
+                day_start = float((date(int(year), int(month), int(day)).toordinal() - _EPOCH_ORDINAL) * 86400)
+                self._day_seconds[day_key] = day_start
+            seconds = (day_start + int(hour) * 3600 + int(minute) * 60 + int(second)
+                       + int(fraction.ljust(6, '0')) / 1e6)
+
+        self.start_time.append(seconds)
+        self.state_duration.append(item.get("stateDuration", 0))
+        self.type.append(self._TYPE_CODES[item.get("type")])
+        self.is_active.append(bool(item.get("isActive", False)))
+
+    def _mask(self, code: int) -> bytes:
+        """Return a selector with 1 for every level of type code (translated in one C call)."""
+        return self.type.tobytes().translate(self._TYPE_MASKS[code])
+
+    def duration_by_type(self) -> Dict[SessionItemType, timedelta]:
+        """Return the total duration per SessionItemType."""
+        return {item: timedelta(seconds=sum(compress(self.state_duration, self._mask(code))))
+                for code, item in enumerate(self.TYPES)}
+
+    def count_by_type(self) -> Dict[SessionItemType, int]:
+        """Return the number of levels per SessionItemType (e.g. wake counts for AWAKE)."""
+        return {item: self.type.count(code) for code, item in enumerate(self.TYPES)}
+
+    def duration_per_day(self, item_type: SessionItemType = SessionItemType.ASLEEP) -> Dict[date, timedelta]:
+        """Return the duration of item_type levels per day (by level start), e.g. the sleep per day."""
+        mask = self._mask(self._TYPE_CODES[item_type.value])
+        days = map(floordiv, compress(self.start_time, mask), repeat(86400.0))
+        totals: Dict[float, float] = {}
+        # Levels are in chronological order, so Python code only runs once per run of a day.
+        for day, rows in groupby(zip(days, compress(self.state_duration, mask)), itemgetter(0)):
+            if not math.isnan(day):
+                totals[day] = totals.get(day, 0.0) + sum(map(itemgetter(1), rows))
+        return {date.fromordinal(_EPOCH_ORDINAL + int(day)): timedelta(seconds=total)
+                for day, total in sorted(totals.items())}
+
+
 class AggregatedSessionInterval(Enum):
     """Enum for AggregatedSessionInterval"""
     WEEK = 'week'
@@ -474,8 +670,9 @@ class AggregatedSessionInterval(Enum):
 
 
 @dataclass(frozen=True)
-class AggregatedDays:
+class AggregatedDays(_FrozenSlots):
     """Object for Snoo AggregatedDays information."""
+    __slots__ = ('total_sleep', 'day_sleep', 'night_sleep', 'longest_sleep', 'night_wakings')
     total_sleep: List[timedelta]
     day_sleep: List[timedelta]
     night_sleep: List[timedelta]
@@ -508,8 +705,10 @@ class AggregatedDays:
 
 
 @dataclass(frozen=True)
-class AggregatedSessionAvg:
+class AggregatedSessionAvg(_FrozenSlots):
     """Object for Snoo AggregatedSessionAvg information."""
+    __slots__ = ('total_sleep_avg', 'day_sleep_avg', 'night_sleep_avg', 'longest_sleep_avg', 'night_wakings_avg',
+                 'days')
 
     total_sleep_avg: timedelta
     day_sleep_avg: timedelta
@@ -547,8 +746,9 @@ class AggregatedSessionAvg:
 
 
 @dataclass(frozen=True)
-class Signal:
+class Signal(_FrozenSlots):
     """Object for Snoo Signal information."""
+    __slots__ = ('rssi', 'strength')
     rssi: int
     strength: int
 
@@ -559,12 +759,17 @@ class Signal:
 
     def to_dict(self):
         """Return dict from Object"""
-        return vars(self)
+        return {
+            "rssi": self.rssi,
+            "strength": self.strength
+        }
 
 
 @dataclass(frozen=True)
-class StateMachine:
+class StateMachine(_FrozenSlots):
     """Object for Snoo StateMachine information."""
+    __slots__ = ('up_transition', 'since_session_start', 'sticky_white_noise', 'weaning', 'time_left', 'session_id',
+                 'state', 'is_active_session', 'down_transition', 'hold', 'audio')
 
     up_transition: SessionLevel
     since_session_start: timedelta
@@ -607,6 +812,23 @@ class StateMachine:
             audio=data.get("audio") == 'on'
         )
 
+    def to_message(self):
+        """Return PubNub message payload (as parsed by from_dict) from Object"""
+        return {
+            'up_transition': self.up_transition.value,
+            'since_session_start_ms': (-1 if self.since_session_start is None
+                                       else round(self.since_session_start.total_seconds() * 1000)),
+            'sticky_white_noise': 'on' if self.sticky_white_noise else 'off',
+            'weaning': 'on' if self.weaning else 'off',
+            'time_left': -1 if self.time_left is None else round(self.time_left.total_seconds()),
+            'session_id': self.session_id,
+            'state': self.state.value,
+            'is_active_session': 'true' if self.is_active_session else 'false',
+            'down_transition': self.down_transition.value,
+            'hold': 'on' if self.hold else 'off',
+            'audio': 'on' if self.audio else 'off'
+        }
+
     def to_dict(self):
         """Return dict from Object"""
         return {
@@ -633,9 +855,16 @@ class EventType(Enum):
     SAFETY_CLIP = 'safety_clip'
 
 
+def _event_time_ms_to_dt(event_time_ms: int) -> datetime:
+    """Convert the epoch milliseconds of an activity state to an UTC datetime."""
+    return datetime.utcfromtimestamp(event_time_ms / 1000).replace(tzinfo=timezone.utc)
+
+
 @dataclass(frozen=True)
-class ActivityState:
+class ActivityState(_FrozenSlots):
     """Return AggregatedSessionAvg object from dict."""
+    __slots__ = ('left_safety_clip', 'rx_signal', 'right_safety_clip', 'sw_version', 'event_time', 'state_machine',
+                 'system_state', 'event')
 
     left_safety_clip: bool
     rx_signal: Signal
@@ -654,12 +883,25 @@ class ActivityState:
             rx_signal=Signal.from_dict(data.get("rx_signal", {})),
             right_safety_clip=bool(data.get("right_safety_clip")),
             sw_version=data.get("sw_version"),
-            event_time=datetime.utcfromtimestamp(data.get("event_time_ms") / 1000).replace(tzinfo=timezone.utc),
+            event_time=_event_time_ms_to_dt(data.get("event_time_ms")),
             state_machine=StateMachine.from_dict(data.get("state_machine", {})),
             system_state=data.get("system_state"),
             event=EventType(data.get("event", EventType.ACTIVITY.value)),
         )
 
+    def to_message(self):
+        """Return PubNub message payload (as parsed by from_dict) from Object"""
+        return {
+            "left_safety_clip": int(self.left_safety_clip),
+            "rx_signal": self.rx_signal.to_dict(),
+            "right_safety_clip": int(self.right_safety_clip),
+            "sw_version": self.sw_version,
+            "event_time_ms": round(self.event_time.timestamp() * 1000),
+            "state_machine": self.state_machine.to_message(),
+            "system_state": self.system_state,
+            "event": self.event.value,
+        }
+
     def to_dict(self):
         """Return dict from Object"""
         return {
@@ -672,3 +914,86 @@ class ActivityState:
             "system_state": self.system_state,
             "event": self.event.value,
         }
+
+
+class _LazyField:
+    """Descriptor decoding a LazyActivityState field from the raw message on first access."""
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, decode: Callable[[dict], Any]):
+        self._decode = decode
+        self._name = None
+
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        # pylint: disable=protected-access
+        try:
+            return instance._decoded[self._name]
+        except KeyError:
+            value = instance._decoded[self._name] = self._decode(instance.raw)
+            return value
+
+
+class LazyActivityState:
+    """ActivityState that keeps the raw message and decodes each field on first access.
+
+    Provides the same attributes, to_dict() and to_message() as ActivityState and compares equal to the
+    ActivityState decoded from the same message.
+    """
+    __slots__ = ('raw', '_decoded')
+
+    left_safety_clip = _LazyField(lambda data: bool(data.get("left_safety_clip")))
+    rx_signal = _LazyField(lambda data: Signal.from_dict(data.get("rx_signal", {})))
+    right_safety_clip = _LazyField(lambda data: bool(data.get("right_safety_clip")))
+    sw_version = _LazyField(lambda data: data.get("sw_version"))
+    event_time = _LazyField(lambda data: _event_time_ms_to_dt(data.get("event_time_ms")))
+    state_machine = _LazyField(lambda data: StateMachine.from_dict(data.get("state_machine", {})))
+    system_state = _LazyField(lambda data: data.get("system_state"))
+    event = _LazyField(lambda data: EventType(data.get("event", EventType.ACTIVITY.value)))
+
+    def __init__(self, data: dict):
+        """Wrap the raw activity state message data."""
+        self.raw = data
+        self._decoded = {}
+
+    def decode(self) -> ActivityState:
+        """Return the fully decoded ActivityState."""
+        return ActivityState(
+            left_safety_clip=self.left_safety_clip,
+            rx_signal=self.rx_signal,
+            right_safety_clip=self.right_safety_clip,
+            sw_version=self.sw_version,
+            event_time=self.event_time,
+            state_machine=self.state_machine,
+            system_state=self.system_state,
+            event=self.event,
+        )
+
+    def to_message(self):
+        """Return PubNub message payload from Object"""
+        return self.raw
+
+    def to_dict(self):
+        """Return dict from Object"""
+        return self.decode().to_dict()
+
+    def __eq__(self, other):
+        if isinstance(other, LazyActivityState):
+            other = other.decode()
+        if not isinstance(other, ActivityState):
+            return NotImplemented
+        return self.decode() == other
+
+    def __hash__(self):
+        return hash(self.decode())
+
+    def __repr__(self):
+        return 'Lazy{!r}'.format(self.decode())
+
+
+# State passed to activity state listeners: an ActivityState, or a LazyActivityState without eager decoding
+AnyActivityState = Union[ActivityState, LazyActivityState]
@@ -6,16 +6,28 @@ Adapted from: https://gist.github.com/kellerza/5ca798f49983bb702bc6e7a05ba53def
 - Allow modifier function on fetch_token and refresh_token in order to allow
   JSON Content-Type.
 """
+import asyncio
 import logging
+import time
 import aiohttp
 
 from oauthlib.common import generate_token, urldecode
-from oauthlib.oauth2 import WebApplicationClient, InsecureTransportError
+from oauthlib.oauth2 import WebApplicationClient, InsecureTransportError, OAuth2Error
 from oauthlib.oauth2 import TokenExpiredError, is_secure_transport
 
+from .instrumentation import (INSTRUMENTATION, REQUEST_START, REQUEST_END,
+                              TOKEN_REFRESH)
+from .retry import NO_RETRY
+
 
 _LOGGER = logging.getLogger(__name__)
 
+# Seconds to wait before retrying a failed background token renewal.
+TOKEN_RENEWAL_RETRY_DELAY = 30
+# Minimum seconds between background token renewals, also if the token lifetime is shorter than
+# the renewal margin.
+MIN_TOKEN_RENEWAL_INTERVAL = 60
+
 
 class TokenUpdated(Warning):
     """Exception."""
@@ -48,7 +60,8 @@ class OAuth2Session(aiohttp.ClientSession):
     def __init__(
             self, client_id=None, client=None, auto_refresh_url=None,
             auto_refresh_kwargs=None, scope=None, redirect_uri=None,
-            token=None, state=None, token_updater=None, **kwargs):
+            token=None, state=None, token_updater=None,
+            token_renewal_margin=None, retry_policy=None, **kwargs):
         """Construct a new OAuth 2 client session.
 
         :param client_id: Client id obtained during registration
@@ -73,9 +86,21 @@ class OAuth2Session(aiohttp.ClientSession):
                         set a TokenUpdated warning will be raised when a token
                         has been refreshed. This warning will carry the token
                         in its token argument.
+        :token_renewal_margin: Seconds before the token expires at which a
+                               background task renews it. Requires
+                               auto_refresh_url. The task runs while the
+                               session is entered as async context manager.
+                               Disabled if None.
+        :retry_policy: :class:`pysnoo.retry.RetryPolicy` applied to all
+                       requests. A deadline and a policy replacing this one
+                       can also be passed per request as deadline and
+                       retry_policy keyword arguments. Requests are not
+                       retried if None.
         :param kwargs: Arguments to pass to the Session constructor.
         """
         super().__init__(**kwargs)
+        # Signals the background token renewal that the token changed.
+        self._token_changed_event = asyncio.Event()
         self._client = client or WebApplicationClient(client_id, token=token)
         self.token = token or {}
         self.scope = scope
@@ -85,6 +110,11 @@ class OAuth2Session(aiohttp.ClientSession):
         self.auto_refresh_url = auto_refresh_url
         self.auto_refresh_kwargs = auto_refresh_kwargs or {}
         self.token_updater = token_updater
+        # Shared refresh of all concurrent requests hitting an expired token.
+        self._refresh_future = None
+        self.token_renewal_margin = token_renewal_margin
+        self._token_renewal_task = None
+        self.retry_policy = retry_policy
 
         # Allow customizations for non compliant providers through various
         # hooks to adjust requests and responses.
@@ -94,6 +124,16 @@ class OAuth2Session(aiohttp.ClientSession):
             'protected_request': set(),
         }
 
+    async def __aenter__(self):
+        session = await super().__aenter__()
+        if self.token_renewal_margin is not None:
+            self._start_token_renewal()
+        return session
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._stop_token_renewal()
+        await super().__aexit__(exc_type, exc_val, exc_tb)
+
     def new_state(self):
         """Generates a state string to be used in authorizations."""
         try:
@@ -130,6 +170,7 @@ class OAuth2Session(aiohttp.ClientSession):
         """Set the token."""
         self._client.token = value
         self._client.populate_token_attributes(value)
+        self._token_changed_event.set()
 
     @property
     def access_token(self):
@@ -355,10 +396,30 @@ class OAuth2Session(aiohttp.ClientSession):
                 self.token['refresh_token'] = refresh_token
             return self.token
 
-    async def _request(
+    async def _request(self, method, url, **kwargs):  # pylint: disable=arguments-differ
+        """Send a request, emitting REQUEST_START and REQUEST_END if hooked."""
+        hooks = INSTRUMENTATION.hooks
+        if not (hooks[REQUEST_START] or hooks[REQUEST_END]):
+            return await self._authorized_request(method, url, **kwargs)
+
+        INSTRUMENTATION.emit(REQUEST_START, method=method, url=str(url))
+        start = time.perf_counter()
+        try:
+            resp = await self._authorized_request(method, url, **kwargs)
+        except BaseException as error:
+            INSTRUMENTATION.emit(REQUEST_END, time.perf_counter() - start,
+                                 method=method, url=str(url), status='',
+                                 error=type(error).__name__)
+            raise
+        INSTRUMENTATION.emit(REQUEST_END, time.perf_counter() - start,
+                             method=method, url=str(url),
+                             status=str(resp.status), error='')
+        return resp
+
+    async def _authorized_request(
             self, method, url, *, data=None, headers=None,
             withhold_token=False, client_id=None, client_secret=None,
-            **kwargs):  # pylint: disable=arguments-differ
+            deadline=None, retry_policy=None, **kwargs):
         """Intercept all requests and add the OAuth 2 token if present."""
         if not is_secure_transport(url):
             raise InsecureTransportError()
@@ -383,13 +444,9 @@ class OAuth2Session(aiohttp.ClientSession):
                             "Basic auth credentials.", client_id)
                         auth = aiohttp.BasicAuth(
                             login=client_id, password=client_secret)
-                    token = await self.refresh_token(
-                        self.auto_refresh_url, auth=auth, **kwargs)
+                    token = await self._refresh_token_single_flight(
+                        auth=auth, **kwargs)
                     if self.token_updater:
-                        _LOGGER.debug(
-                            "Updating token to %s using %s.",
-                            token, self.token_updater)
-                        self.token_updater(token)
                         url, headers, data = self._client.add_token(
                             url, http_method=method, body=data,
                             headers=headers)
@@ -401,9 +458,155 @@ class OAuth2Session(aiohttp.ClientSession):
         _LOGGER.debug('Requesting url %s using method %s.', url, method)
         _LOGGER.debug('Supplying headers %s and data %s', headers, data)
         _LOGGER.debug('Passing through key word arguments %s.', kwargs)
-        return await super()._request(
+        retry_policy = retry_policy or self.retry_policy
+        if retry_policy is None and deadline is None:
+            return await super()._request(
+                method, url, headers=headers, data=data, **kwargs)
+        return await self._request_with_retries(
+            retry_policy or NO_RETRY, deadline,
             method, url, headers=headers, data=data, **kwargs)
 
+    async def _request_with_retries(self, policy, deadline, method, url,
+                                    **kwargs):
+        """Send a request according to a RetryPolicy.
+
+        Returns the last response, also if its status is still retryable
+        after the last attempt or its Retry-After exceeds backoff_max.
+        Connection errors and timeouts of the last attempt are raised.
+        Methods other than retry_methods are sent once.
+        """
+        loop = asyncio.get_event_loop()
+        if deadline is None:
+            deadline = policy.deadline
+        deadline_at = None if deadline is None else loop.time() + deadline
+        bound_by_deadline = (deadline_at is not None
+                             and kwargs.get('timeout') is None)
+        max_attempts = (policy.max_attempts
+                        if method.upper() in policy.retry_methods else 1)
+        attempt = 0
+        while True:
+            attempt += 1
+            if bound_by_deadline:
+                # Bound the request by the time left.
+                kwargs['timeout'] = aiohttp.ClientTimeout(
+                    total=max(0.0, deadline_at - loop.time()))
+
+            try:
+                resp = await super()._request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                if attempt >= max_attempts:
+                    raise
+                delay = policy.backoff(attempt)
+                if deadline_at is not None and loop.time() + delay >= deadline_at:
+                    raise
+                _LOGGER.debug('%s %s failed (%r), retrying in %.2fs.',
+                              method, url, error, delay)
+            else:
+                if resp.status not in policy.retry_statuses or attempt >= max_attempts:
+                    return resp
+                retry_after = policy.retry_after(resp.headers)
+                if retry_after is not None and retry_after > policy.backoff_max:
+                    # Not worth blocking the caller, who gets the response.
+                    return resp
+                delay = policy.backoff(attempt) if retry_after is None else retry_after
+                if deadline_at is not None and loop.time() + delay >= deadline_at:
+                    return resp
+                _LOGGER.debug('%s %s returned %s, retrying in %.2fs.',
+                              method, url, resp.status, delay)
+                resp.release()
+            await asyncio.sleep(delay)
+
+    async def _refresh_token_single_flight(self, **kwargs):
+        """Refresh the token at auto_refresh_url, sharing one in-flight refresh.
+
+        All concurrent callers await the same refresh request. The resulting
+        token is handed to token_updater exactly once.
+        """
+        if self._refresh_future is None:
+            self._refresh_future = asyncio.ensure_future(
+                self._auto_refresh_token(**kwargs))
+        else:
+            _LOGGER.debug('Awaiting token refresh already in flight.')
+        # Shield, so that a cancelled waiter does not abort the shared refresh.
+        return await asyncio.shield(self._refresh_future)
+
+    async def _auto_refresh_token(self, **kwargs):
+        """Refresh the token at auto_refresh_url and invoke token_updater."""
+        start = time.perf_counter()
+        outcome = 'failure'
+        try:
+            token = await self.refresh_token(self.auto_refresh_url, **kwargs)
+            outcome = 'success'
+            if self.token_updater:
+                _LOGGER.debug(
+                    "Updating token to %s using %s.",
+                    token, self.token_updater)
+                self.token_updater(token)
+            return token
+        finally:
+            self._refresh_future = None
+            if INSTRUMENTATION.hooks[TOKEN_REFRESH]:
+                INSTRUMENTATION.emit(TOKEN_REFRESH, time.perf_counter() - start,
+                                     outcome=outcome)
+
+    def _start_token_renewal(self):
+        """Start the background task renewing the token ahead of expiry."""
+        if not self.auto_refresh_url:
+            raise ValueError('No token endpoint set for token renewal.')
+        if self._token_renewal_task is None:
+            self._token_renewal_task = asyncio.ensure_future(self._token_renewal_loop())
+
+    async def _stop_token_renewal(self):
+        """Stop the background token renewal task."""
+        if self._token_renewal_task is None:
+            return
+        self._token_renewal_task.cancel()
+        try:
+            await self._token_renewal_task
+        except asyncio.CancelledError:
+            pass
+        self._token_renewal_task = None
+
+    def _token_renewal_delay(self):
+        """Seconds until the token is due for renewal, or None if it does not expire."""
+        # pylint: disable=protected-access
+        expires_at = getattr(self._client, '_expires_at', None)
+        if not self.token or not self.token.get('refresh_token') or expires_at is None:
+            return None
+        return max(0, expires_at - self.token_renewal_margin - time.time())
+
+    async def _token_renewal_loop(self):
+        """Renew the token token_renewal_margin seconds before it expires."""
+        loop = asyncio.get_event_loop()
+        renewed_at = None
+        while True:
+            self._token_changed_event.clear()
+            delay = self._token_renewal_delay()
+            if delay is not None and renewed_at is not None:
+                delay = max(delay, renewed_at + MIN_TOKEN_RENEWAL_INTERVAL - loop.time())
+            try:
+                # Re-evaluate the schedule whenever the token changes.
+                await asyncio.wait_for(self._token_changed_event.wait(), delay)
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            _LOGGER.debug('Renewing token ahead of expiry at %s.', self.auto_refresh_url)
+            try:
+                await self._refresh_token_single_flight()
+                renewed_at = loop.time()
+            except (OAuth2Error, aiohttp.ClientError, asyncio.TimeoutError) as error:
+                _LOGGER.warning('Background token renewal failed (%s), retrying in %ss.',
+                                error, TOKEN_RENEWAL_RETRY_DELAY)
+                await asyncio.sleep(TOKEN_RENEWAL_RETRY_DELAY)
+            except asyncio.CancelledError:  # pylint: disable=try-except-raise
+                # An Exception before Python 3.8
+                raise
+            except Exception:  # pylint: disable=broad-except
+                # E.g. an invalid refresh response or a failing token_updater must not end the renewal.
+                _LOGGER.exception('Background token renewal failed, retrying in %ss.', TOKEN_RENEWAL_RETRY_DELAY)
+                await asyncio.sleep(TOKEN_RENEWAL_RETRY_DELAY)
+
     def _invoke_hooks(self, reqres, hook_type):
         _LOGGER.debug(
             "Invoking %d %s hooks.", len(self.compliance_hook[hook_type]),
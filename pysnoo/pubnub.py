@@ -1,26 +1,51 @@
 """PySnoo PubNub Interface."""
 import asyncio
 import logging
-from typing import Callable, Optional, List
+import time
+from collections import deque
+from enum import Enum
+from typing import AsyncIterator, Callable, Dict, Optional, List
 
 from pubnub.callbacks import SubscribeCallback
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.pubnub_asyncio import PubNubAsyncio, utils
 
-from .models import ActivityState, SessionLevel
+from .dispatcher import ControlCommandDispatcher, CommandAckTracker
+from .instrumentation import INSTRUMENTATION, ACTIVITY_STATE_DECODE, LISTENER_DISPATCH
+from .models import ActivityState, AnyActivityState, LazyActivityState, SessionLevel
 from .const import SNOO_PUBNUB_PUBLISH_KEY, SNOO_PUBNUB_SUBSCRIBE_KEY
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def _dispatch(channel: str, listeners: List[Callable[[AnyActivityState], None]], state: AnyActivityState) -> None:
+    """Pass state to all listeners of channel, emitting LISTENER_DISPATCH if hooked"""
+    if not INSTRUMENTATION.hooks[LISTENER_DISPATCH]:
+        for update_callback in listeners:
+            update_callback(state)
+        return
+    start = time.perf_counter()
+    for update_callback in listeners:
+        update_callback(state)
+    INSTRUMENTATION.emit(LISTENER_DISPATCH, time.perf_counter() - start, channel=channel, listeners=str(len(listeners)))
+
+
 class SnooSubscribeListener(SubscribeCallback):
     """Snoo Subscription Listener Class"""
 
-    def __init__(self, callback: Callable[[ActivityState], None]):
-        """Initialize the Snoo Subscription Listener"""
+    def __init__(self,
+                 callback: Callable[[AnyActivityState], None],
+                 eager_decoding: bool = True):
+        """Initialize the Snoo Subscription Listener
+
+        :param callback: Called with every received activity state
+        :param eager_decoding: Decode messages into ActivityState right away. If False, pass a
+                               LazyActivityState instead, which decodes fields on first access.
+        """
         self.connected_event = asyncio.Event()
         self.disconnected_event = asyncio.Event()
         self._callback = callback
+        self._eager_decoding = eager_decoding
 
     def status(self, pubnub, status):
         """PubNub Status Callback Implementation"""
@@ -35,7 +60,18 @@ class SnooSubscribeListener(SubscribeCallback):
 
     def message(self, pubnub, message):
         """PubNub Message Callback Implementation"""
-        self._callback(ActivityState.from_dict(message.message))
+        self._callback(self._decode(message))
+
+    def _decode(self, message) -> AnyActivityState:
+        """Decode a PubNub message, emitting ACTIVITY_STATE_DECODE if hooked"""
+        if not self._eager_decoding:
+            return LazyActivityState(message.message)
+        if not INSTRUMENTATION.hooks[ACTIVITY_STATE_DECODE]:
+            return ActivityState.from_dict(message.message)
+        start = time.perf_counter()
+        state = ActivityState.from_dict(message.message)
+        INSTRUMENTATION.emit(ACTIVITY_STATE_DECODE, time.perf_counter() - start, channel=message.channel)
+        return state
 
     def presence(self, pubnub, presence):
         """PubNub Presence Callback Implementation"""
@@ -55,6 +91,123 @@ class SnooSubscribeListener(SubscribeCallback):
             await self.disconnected_event.wait()
 
 
+class OverflowPolicy(Enum):
+    """Enum for the behaviour of a full ActivityStateQueue"""
+    # Discard the oldest queued state to make room
+    DROP_OLDEST = 'drop_oldest'
+    # Discard the incoming state
+    DROP_NEWEST = 'drop_newest'
+    # Keep states waiting for room in arrival order; beyond max_pending, incoming states are dropped
+    BLOCK = 'block'
+
+
+class ActivityStateQueue:
+    """Bounded queue of activity states for a single consumer.
+
+    Filled by a SnooPubNub listener without ever blocking message intake, and consumed as async
+    iterator. Also an async context manager that removes the listener on exit.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self,
+                 maxsize: int = 100,
+                 overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 remove_listener: Callable[[], None] = None,
+                 max_pending: int = 1000):
+        """Initialize the queue.
+
+        :param maxsize: Maximum number of queued states
+        :param overflow: What to do with states that arrive while the queue is full
+        :param remove_listener: Called on close() to detach the queue from its source
+        :param max_pending: Maximum number of states waiting for room with OverflowPolicy.BLOCK
+        """
+        self._queue = asyncio.Queue(maxsize)
+        self.overflow = overflow
+        self.max_pending = max_pending
+        self._remove_listener = remove_listener
+        # States waiting for room, moved into the queue in order by a single feeder task
+        self._pending = deque()
+        self._feeder: Optional[asyncio.Future] = None
+        # Whether the current overload has been logged
+        self._overloaded = False
+        self._closed = False
+        # Counters
+        self.received = 0
+        self.dropped = 0
+
+    @property
+    def lag(self) -> int:
+        """Return the number of states received, but not consumed yet"""
+        return self._queue.qsize() + len(self._pending)
+
+    def put(self, state: AnyActivityState) -> None:
+        """Queue a state according to the overflow policy (listener callback)"""
+        if self._closed:
+            return
+        self.received += 1
+        if not self._queue.full() and not self._pending:
+            self._queue.put_nowait(state)
+        elif self.overflow == OverflowPolicy.DROP_OLDEST:
+            self._queue.get_nowait()
+            self._queue.put_nowait(state)
+            self.dropped += 1
+        elif self.overflow == OverflowPolicy.DROP_NEWEST:
+            self.dropped += 1
+        elif len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            if not self._overloaded:
+                self._overloaded = True
+                _LOGGER.warning('Activity state consumer is too slow, dropping states beyond %d pending ones',
+                                self.max_pending)
+        else:
+            self._add_pending(state)
+
+    def _add_pending(self, state) -> None:
+        """Queue state behind the pending states once there is room"""
+        self._pending.append(state)
+        if self._feeder is None:
+            self._feeder = asyncio.ensure_future(self._feed())
+
+    async def _feed(self) -> None:
+        """Move the pending states into the queue as room becomes available"""
+        try:
+            while self._pending:
+                await self._queue.put(self._pending[0])
+                self._pending.popleft()
+        finally:
+            self._feeder = None
+            self._overloaded = False
+
+    def close(self) -> None:
+        """Detach from the source. Iteration ends once the queued states are consumed"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._remove_listener is not None:
+            self._remove_listener()
+        if not self._queue.full() and not self._pending:
+            self._queue.put_nowait(self._CLOSED)
+        else:
+            # Keep all queued states: the end of iteration waits for room behind the pending states.
+            self._add_pending(self._CLOSED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> AnyActivityState:
+        state = await self._queue.get()
+        if state is self._CLOSED:
+            raise StopAsyncIteration
+        return state
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 class SnooPubNub:
     """A Python Abstraction for Snoos PubNub Interface."""
     # pylint: disable=too-few-public-methods,fixme
@@ -63,17 +216,24 @@ class SnooPubNub:
                  access_token: str,
                  serial_number: str,
                  uuid: str,
-                 custom_event_loop=None):
-        """Initialize the Snoo PubNub object."""
+                 custom_event_loop=None,
+                 eager_decoding: bool = True):
+        """Initialize the Snoo PubNub object.
+
+        :param eager_decoding: Pass decoded ActivityStates to the listeners. If False, pass
+                               LazyActivityStates instead, which decode fields on first access.
+        """
         self.config = self._setup_pnconfig(access_token, uuid)
         self.serial_number = serial_number
         self._activiy_channel = 'ActivityState.{}'.format(serial_number)
         self._controlcommand_channel = 'ControlCommand.{}'.format(serial_number)
         self._pubnub = PubNubAsyncio(self.config, custom_event_loop=custom_event_loop)
-        self._listener = SnooSubscribeListener(self._activy_state_callback)
+        self._listener = SnooSubscribeListener(self._activy_state_callback, eager_decoding)
         # Add listener
         self._pubnub.add_listener(self._listener)
-        self._external_listeners: List[Callable[[ActivityState], None]] = []
+        self._external_listeners: List[Callable[[AnyActivityState], None]] = []
+        self._dispatcher: Optional[ControlCommandDispatcher] = None
+        self.ack_tracker = CommandAckTracker(serial_number)
 
     @staticmethod
     def _setup_pnconfig(access_token, uuid):
@@ -86,7 +246,7 @@ class SnooPubNub:
         pnconfig.ssl = True
         return pnconfig
 
-    def add_listener(self, update_callback: Callable[[ActivityState], None]) -> Callable[[], None]:
+    def add_listener(self, update_callback: Callable[[AnyActivityState], None]) -> Callable[[], None]:
         """Add a AcitivyState Listener to the SnooPubNub Entity and returns a remove_listener CB for that listener"""
         self._external_listeners.append(update_callback)
 
@@ -96,14 +256,34 @@ class SnooPubNub:
 
         return remove_listener_cb
 
-    def remove_listener(self, update_callback: Callable[[ActivityState], None]) -> None:
+    def remove_listener(self, update_callback: Callable[[AnyActivityState], None]) -> None:
         """Remove data update."""
         self._external_listeners.remove(update_callback)
 
-    def _activy_state_callback(self, state: ActivityState):
+    def _activy_state_callback(self, state: AnyActivityState):
         """Internal Callback of SnooSubscribeListener"""
-        for update_callback in self._external_listeners:
-            update_callback(state)
+        self.ack_tracker.on_activity_state(state)
+        _dispatch(self._activiy_channel, self._external_listeners, state)
+
+    def events(self,
+               maxsize: int = 100,
+               overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+               max_pending: int = 1000) -> ActivityStateQueue:
+        """Return a bounded queue receiving all following activity states
+
+        Slow consumers never stall the subscribe loop; see OverflowPolicy and ActivityStateQueue. Usage:
+
+            async with pubnub.events() as events:
+                async for state in events:
+                    ...
+        """
+        queue = ActivityStateQueue(maxsize, overflow, lambda: self.remove_listener(queue.put), max_pending)
+        self.add_listener(queue.put)
+        return queue
+
+    def is_subscribed(self) -> bool:
+        """Returns true if there is an active subscription to the Snoo Activity Channel"""
+        return self._listener.is_connected()
 
     def subscribe(self):
         """Subscribe to Snoo Activity Channel"""
@@ -143,27 +323,114 @@ class SnooPubNub:
         ).count(count).future()
         return [ActivityState.from_dict(item.entry) for item in envelope.result.messages]
 
+    async def iter_history(self,
+                           start: Optional[int] = None,
+                           end: Optional[int] = None,
+                           page_size: int = 100) -> AsyncIterator[ActivityState]:
+        """Yield historic messages from newest to oldest, walking the history page by page
+
+        The next page is requested while the current one is consumed, so at most two pages are
+        held in memory.
+
+        :param start: Only messages older than this timetoken (exclusive). Newest if None.
+        :param end: Only messages newer than or at this timetoken (inclusive). Oldest if None.
+        :param page_size: Messages per request (PubNub allows up to 100)
+        """
+        async def fetch_page(page_start: Optional[int]):
+            builder = self._pubnub.history().channel(self._activiy_channel).count(page_size)
+            if page_start is not None:
+                builder = builder.start(page_start)
+            if end is not None:
+                builder = builder.end(end)
+            return (await builder.future()).result
+
+        next_page = asyncio.ensure_future(fetch_page(start))
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                # A full page indicates more messages before its oldest timetoken.
+                if len(page.messages) == page_size and page.start_timetoken:
+                    next_page = asyncio.ensure_future(fetch_page(page.start_timetoken))
+                # Pages are in chronological order
+                for item in reversed(page.messages):
+                    yield ActivityState.from_dict(item.entry)
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
     async def publish(self, message):
         """Publish a message to the Snoo control command channel"""
         task = await self._pubnub.publish().channel(
             self._controlcommand_channel).message(message).future()
         return task
 
-    async def publish_goto_state(self, level: SessionLevel, hold: Optional[bool] = None):
-        """Publish a message a go_to_state command to the Snoo control command channel"""
+    @property
+    def dispatcher(self) -> ControlCommandDispatcher:
+        """Return the command dispatcher of the control command channel (created on first access)"""
+        if self._dispatcher is None:
+            self._dispatcher = ControlCommandDispatcher(self.publish)
+        return self._dispatcher
+
+    @staticmethod
+    def _goto_state_message(level: SessionLevel, hold: Optional[bool] = None):
+        """Generate go_to_state command"""
         msg = {
             'command': 'go_to_state',
             'state': level.value
         }
         if hold is not None:
             msg['hold'] = 'on' if hold else 'off'
+        return msg
+
+    async def publish_goto_state(self, level: SessionLevel, hold: Optional[bool] = None, coalesce: bool = False):
+        """Publish a message a go_to_state command to the Snoo control command channel
+
+        :param coalesce: Send through the dispatcher, which merges go_to_state commands in quick
+                         succession into one publish. Returns a CommandResult in that case.
+        """
+        msg = self._goto_state_message(level, hold)
+        if coalesce:
+            return await self.dispatcher.submit(msg)
         return await self.publish(msg)
 
-    async def publish_start(self):
-        """Publish a message a start_snoo command to the Snoo control command channel"""
-        return await self.publish({
+    async def publish_start(self, coalesce: bool = False):
+        """Publish a message a start_snoo command to the Snoo control command channel
+
+        :param coalesce: Send through the dispatcher to keep the order with coalesced commands.
+                         Returns a CommandResult in that case.
+        """
+        msg = {
             'command': 'start_snoo'
-        })
+        }
+        if coalesce:
+            return await self.dispatcher.submit(msg)
+        return await self.publish(msg)
+
+    async def publish_goto_state_and_wait(self,
+                                          level: SessionLevel,
+                                          hold: Optional[bool] = None,
+                                          timeout: float = 10.0) -> AnyActivityState:
+        """Publish a go_to_state command and return the acknowledging activity state of the Snoo
+
+        Requires an active subscription. Publish-to-ack latencies are recorded in ack_tracker.
+
+        :raises asyncio.TimeoutError: The Snoo did not reach level within timeout seconds
+        """
+        def is_ack(state: AnyActivityState) -> bool:
+            return state.state_machine.state == level and (hold is None or state.state_machine.hold == hold)
+
+        return await self.ack_tracker.publish_and_wait(lambda: self.publish_goto_state(level, hold), is_ack, timeout)
+
+    async def publish_start_and_wait(self, timeout: float = 10.0) -> AnyActivityState:
+        """Publish a start_snoo command and return the acknowledging activity state of the Snoo
+
+        Requires an active subscription. Publish-to-ack latencies are recorded in ack_tracker.
+
+        :raises asyncio.TimeoutError: The Snoo did not start within timeout seconds
+        """
+        return await self.ack_tracker.publish_and_wait(
+            self.publish_start, lambda state: state.state_machine.state.is_active_level(), timeout)
 
     async def stop(self):
         """Stop and Cleanup the Async Pubnub Utility"""
@@ -171,6 +438,191 @@ class SnooPubNub:
         # Workaround until PR is accepted:
         # https://github.com/pubnub/python/pull/99
         # self._pubnub.stop()
+        if self._dispatcher is not None:
+            await self._dispatcher.close()
+        await self._pubnub._session.close()
+        if self._pubnub._subscription_manager is not None:
+            self._pubnub._subscription_manager.stop()
+
+
+class DeviceStateCache:
+    """Latest activity state of a Snoo, kept fresh by the SnooPubNub subscription.
+
+    Reads are served locally while the cached state was received within max_age seconds, and
+    fall back to a history() request otherwise (cold cache or missed messages, e.g. while the
+    subscription was down). The Snoo does not report while idle, so a subscribed but idle device
+    only costs one history() request per max_age.
+    """
+
+    def __init__(self, pubnub: SnooPubNub, max_age: float = 300.0):
+        """Initialize the cache and register it as listener of pubnub
+
+        :param max_age: Staleness bound in seconds
+        """
+        self._pubnub = pubnub
+        self.max_age = max_age
+        self._state: Optional[AnyActivityState] = None
+        self._updated_at: Optional[float] = None
+        self._remove_listener = pubnub.add_listener(self.update)
+
+    @property
+    def age(self) -> Optional[float]:
+        """Return the seconds since the cached state was received (None if cold)"""
+        if self._updated_at is None:
+            return None
+        return asyncio.get_event_loop().time() - self._updated_at
+
+    @property
+    def is_fresh(self) -> bool:
+        """Return True if the cached state may be used without a history() request"""
+        age = self.age
+        return age is not None and age <= self.max_age
+
+    def update(self, state: AnyActivityState) -> None:
+        """Update the cache unless state is older than the cached one (listener callback)"""
+        if self._state is not None and state.event_time < self._state.event_time:
+            return
+        self._state = state
+        self._updated_at = asyncio.get_event_loop().time()
+
+    def invalidate(self) -> None:
+        """Force the next get() to request history"""
+        self._updated_at = None
+
+    async def get(self) -> Optional[AnyActivityState]:
+        """Return the latest activity state (None if the device has no history)"""
+        if not self.is_fresh:
+            _LOGGER.debug('Device state cache of %s is cold or stale, requesting history',
+                          self._pubnub.serial_number)
+            for state in await self._pubnub.history():
+                self.update(state)
+        return self._state
+
+    def close(self) -> None:
+        """Remove the cache listener from pubnub"""
+        self._remove_listener()
+
+
+class SnooMultiplexSubscribeListener(SnooSubscribeListener):
+    """Snoo Subscription Listener Class passing the channel of every message along"""
+
+    def __init__(self,
+                 callback: Callable[[str, AnyActivityState], None],
+                 eager_decoding: bool = True):
+        """Initialize the Snoo Multiplex Subscription Listener
+
+        :param callback: Called with the channel and activity state of every received message
+        :param eager_decoding: Decode messages into ActivityState right away. If False, pass a
+                               LazyActivityState instead, which decodes fields on first access.
+        """
+        super().__init__(None, eager_decoding)
+        self._channel_callback = callback
+
+    def message(self, pubnub, message):
+        """PubNub Message Callback Implementation"""
+        self._channel_callback(message.channel, self._decode(message))
+
+
+class SnooPubNubMultiplexer:
+    """A single PubNub subscription to the activity channels of many Snoo devices.
+
+    All devices share one PubNub client, subscribe loop and HTTP session. Messages are routed to
+    the listeners of their device by channel name. All devices must be accessible with access_token.
+    """
+
+    def __init__(self,
+                 access_token: str,
+                 uuid: str,
+                 custom_event_loop=None,
+                 eager_decoding: bool = True):
+        """Initialize the Snoo PubNub Multiplexer object.
+
+        :param eager_decoding: Pass decoded ActivityStates to the listeners. If False, pass
+                               LazyActivityStates instead, which decode fields on first access.
+        """
+        # pylint: disable=protected-access
+        self.config = SnooPubNub._setup_pnconfig(access_token, uuid)
+        self._pubnub = PubNubAsyncio(self.config, custom_event_loop=custom_event_loop)
+        self._listener = SnooMultiplexSubscribeListener(self._activy_state_callback, eager_decoding)
+        self._pubnub.add_listener(self._listener)
+        # Listeners by activity channel
+        self._external_listeners: Dict[str, List[Callable[[AnyActivityState], None]]] = {}
+
+    @staticmethod
+    def _activity_channel(serial_number: str) -> str:
+        return 'ActivityState.{}'.format(serial_number)
+
+    @property
+    def serial_numbers(self) -> List[str]:
+        """Return the serial numbers of all added devices"""
+        return [channel.split('.', 1)[1] for channel in self._external_listeners]
+
+    def add_device(self, serial_number: str) -> None:
+        """Add a device. Its channel is subscribed right away if the multiplexer is subscribed"""
+        channel = self._activity_channel(serial_number)
+        if channel in self._external_listeners:
+            return
+        self._external_listeners[channel] = []
+        if self._listener.is_connected():
+            self._pubnub.subscribe().channels([channel]).execute()
+
+    def remove_device(self, serial_number: str) -> None:
+        """Remove a device along with all its listeners and unsubscribe its channel"""
+        channel = self._activity_channel(serial_number)
+        del self._external_listeners[channel]
+        if self._listener.is_connected():
+            self._pubnub.unsubscribe().channels([channel]).execute()
+
+    def add_listener(self,
+                     serial_number: str,
+                     update_callback: Callable[[AnyActivityState], None]) -> Callable[[], None]:
+        """Add a AcitivyState Listener for a device and returns a remove_listener CB for that listener"""
+        self.add_device(serial_number)
+        self._external_listeners[self._activity_channel(serial_number)].append(update_callback)
+
+        def remove_listener_cb() -> None:
+            """Remove listener."""
+            self.remove_listener(serial_number, update_callback)
+
+        return remove_listener_cb
+
+    def remove_listener(self, serial_number: str, update_callback: Callable[[AnyActivityState], None]) -> None:
+        """Remove data update."""
+        self._external_listeners[self._activity_channel(serial_number)].remove(update_callback)
+
+    def _activy_state_callback(self, channel: str, state: AnyActivityState):
+        """Internal Callback of SnooMultiplexSubscribeListener"""
+        _dispatch(channel, self._external_listeners.get(channel, ()), state)
+
+    def subscribe(self):
+        """Subscribe to the Activity Channels of all devices"""
+        if self._listener.is_connected():
+            _LOGGER.warning('Trying to subscribe PubNub instance that is already subscribed')
+            return
+
+        self._pubnub.subscribe().channels(list(self._external_listeners)).execute()
+
+    async def subscribe_and_await_connect(self):
+        """Subscribe to the Activity Channels of all devices and await connect"""
+        self.subscribe()
+        await self._listener.wait_for_connect()
+
+    def unsubscribe(self):
+        """Unsubscribe from the Activity Channels of all devices"""
+        if not self._listener.is_connected():
+            _LOGGER.warning('Trying to unsubscribe PubNub instance that is NOT subscribed')
+            return
+
+        self._pubnub.unsubscribe().channels(list(self._external_listeners)).execute()
+
+    async def unsubscribe_and_await_disconnect(self):
+        """Unsubscribe from the Activity Channels of all devices and await disconnect"""
+        self.unsubscribe()
+        await self._listener.wait_for_disconnect()
+
+    async def stop(self):
+        """Stop and Cleanup the Async Pubnub Utility"""
+        # pylint: disable=protected-access
         await self._pubnub._session.close()
         if self._pubnub._subscription_manager is not None:
             self._pubnub._subscription_manager.stop()
@@ -0,0 +1,60 @@
+"""PySnoo Retry Policy."""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Mapping, Optional
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retry policy for HTTP requests.
+
+    Requests with one of retry_methods failing with a connection error, a timeout or one of
+    retry_statuses are retried with exponential backoff and full jitter, up to max_attempts in
+    total. A Retry-After header takes precedence over the backoff; if it asks for more than
+    backoff_max, the response is returned instead of waiting. With a deadline, retries that would
+    end after the deadline are not attempted and the request itself is bounded by the remaining
+    time.
+    """
+    # Total number of attempts, including the first request
+    max_attempts: int = 4
+    # Backoff before the n-th retry: backoff_base * 2 ** (n - 1), capped by backoff_max
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    # Randomize the backoff between 0 and its value, so that clients do not retry in lockstep
+    jitter: bool = True
+    # Seconds from the start of a call until it gives up (unbounded if None)
+    deadline: Optional[float] = None
+    retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+    # Idempotent methods only, so that e.g. login and token refresh POSTs are sent once
+    retry_methods: FrozenSet[str] = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+    def backoff(self, retry: int) -> float:
+        """Return the delay in seconds before the retry-th retry (starting at 1)"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (retry - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    @staticmethod
+    def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+        """Return the delay in seconds requested by a Retry-After header (seconds or HTTP date)"""
+        value = headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Single attempt
+NO_RETRY = RetryPolicy(max_attempts=1)
@@ -0,0 +1,101 @@
+"""PySnoo Session Pool."""
+import logging
+from typing import Callable, Dict, Iterator, Optional
+
+import aiohttp
+
+from .auth_session import SnooAuthSession
+from .connector import ConnectorConfig
+from .retry import RetryPolicy
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SnooAuthSessionPool:
+    """Pool of SnooAuthSessions for many accounts sharing a single connector.
+
+    Every account keeps its own token state and token_updater, while all accounts share the
+    connections, DNS cache and TLS sessions of one aiohttp connector.
+    """
+
+    def __init__(self,
+                 connector: Optional[aiohttp.BaseConnector] = None,
+                 token_renewal_margin: Optional[float] = None,
+                 retry_policy: Optional[RetryPolicy] = RetryPolicy(),
+                 connector_config: Optional[ConnectorConfig] = None) -> None:
+        """Initialize the pool.
+
+        :param connector: Connector shared by all sessions. A TCPConnector is created (according
+                          to connector_config) if None. The pool owns the connector and closes it
+                          on close().
+        :param token_renewal_margin: Renew the account tokens in the background this many seconds
+                                     before they expire. Disabled if None.
+        :param retry_policy: Retry policy of all sessions. None disables retries.
+        :param connector_config: Connection pool settings of the created connector. aiohttp
+                                 defaults if None.
+        """
+        if connector is not None and connector_config is not None:
+            raise ValueError('Pass either a connector or a connector_config.')
+        self._connector = connector
+        self.connector_config = connector_config
+        self.token_renewal_margin = token_renewal_margin
+        self.retry_policy = retry_policy
+        self._sessions: Dict[str, SnooAuthSession] = {}
+
+    @property
+    def connector(self) -> aiohttp.BaseConnector:
+        """Return the shared connector (created on first use)."""
+        if self._connector is None:
+            if self.connector_config is not None:
+                self._connector = self.connector_config.create_connector()
+            else:
+                self._connector = aiohttp.TCPConnector()
+        return self._connector
+
+    async def add_account(self,
+                          account_id: str,
+                          token: dict = None,
+                          token_updater: Callable[[dict], None] = None) -> SnooAuthSession:
+        """Add an account to the pool and return its (entered) SnooAuthSession"""
+        if account_id in self._sessions:
+            raise ValueError('Account {} is already part of the pool.'.format(account_id))
+
+        session = SnooAuthSession(token=token,
+                                  token_updater=token_updater,
+                                  token_renewal_margin=self.token_renewal_margin,
+                                  connector=self.connector,
+                                  retry_policy=self.retry_policy)
+        await session.__aenter__()
+        self._sessions[account_id] = session
+        return session
+
+    async def remove_account(self, account_id: str) -> None:
+        """Remove an account from the pool and close its session"""
+        session = self._sessions.pop(account_id)
+        await session.__aexit__(None, None, None)
+
+    def __getitem__(self, account_id: str) -> SnooAuthSession:
+        return self._sessions[account_id]
+
+    def __contains__(self, account_id: str) -> bool:
+        return account_id in self._sessions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sessions)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def close(self) -> None:
+        """Close all sessions and the shared connector"""
+        for account_id in list(self._sessions):
+            await self.remove_account(account_id)
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
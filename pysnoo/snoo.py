@@ -1,6 +1,12 @@
 """The main API class"""
-from typing import List, Optional
-from datetime import date, datetime, timedelta
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+
+import aiohttp
 
 from .const import (SNOO_ME_ENDPOINT,
                     SNOO_DEVICES_ENDPOINT,
@@ -11,47 +17,148 @@ from .const import (SNOO_ME_ENDPOINT,
                     SNOO_SESSIONS_TOTAL_TIME_ENDPOINT,
                     DATETIME_FMT_AGGREGATED_SESSION)
 from .auth_session import SnooAuthSession
+from .errors import SnooRateLimitError, SnooServerError, raise_for_status
+from .retry import NO_RETRY, RetryPolicy
+from .instrumentation import INSTRUMENTATION, RESPONSE_DECODE
+from .store import AggregatedSessionStore
 from .models import (User, Device, Baby, Sex,
                      MinimalLevel,
                      MinimalLevelVolume,
                      ResponsivenessLevel,
                      SoothingLevelVolume,
                      LastSession,
+                     Snapshot,
                      AggregatedSession,
                      AggregatedSessionAvg,
                      AggregatedSessionInterval)
 
+_LOGGER = logging.getLogger(__name__)
+
+
+# Suggested time-to-live (in seconds) of cached responses for the slow-changing endpoints.
+DEFAULT_CACHE_TTLS = {
+    SNOO_ME_ENDPOINT: 3600,
+    SNOO_DEVICES_ENDPOINT: 300,
+    SNOO_BABY_ENDPOINT: 300,
+    SNOO_SESSIONS_TOTAL_TIME_ENDPOINT: 60,
+}
+
+# Time after the start of an aggregated session segment at which it is over in every timezone. Its
+# start_time is in the server-side timezone, which may be up to 12 hours behind UTC.
+_SEGMENT_FINAL_AFTER = timedelta(days=1, hours=12)
+
+
+async def _decode(resp, endpoint: str, from_json: Callable[[Any], Any]) -> Any:
+    """Return from_json applied to the JSON body of resp, emitting RESPONSE_DECODE if hooked"""
+    if not INSTRUMENTATION.hooks[RESPONSE_DECODE]:
+        return from_json(await resp.json())
+    start = time.perf_counter()
+    value = from_json(await resp.json())
+    INSTRUMENTATION.emit(RESPONSE_DECODE, time.perf_counter() - start, endpoint=endpoint)
+    return value
+
+
+@dataclass(frozen=True)
+class _CacheEntry:
+    """Cached and parsed response of a GET request."""
+    expires_at: float
+    etag: Optional[str]
+    value: Any
+
 
 class Snoo:
     """A Python Abstraction object to Snoo Smart Sleeper Bassinett."""
-    def __init__(self, auth: SnooAuthSession):
-        """Initialize the Snoo object."""
+    def __init__(self,
+                 auth: SnooAuthSession,
+                 cache_ttls: Optional[Dict[str, float]] = None,
+                 session_store: Optional[AggregatedSessionStore] = None):
+        """Initialize the Snoo object.
+
+        :param auth: Authenticated SnooAuthSession
+        :param cache_ttls: Optional time-to-live in seconds of cached responses per endpoint
+                           (e.g. DEFAULT_CACHE_TTLS). Endpoints that are not listed are never cached.
+                           Expired entries are revalidated with If-None-Match.
+        :param session_store: Optional persistent store serving the aggregated sessions of past days.
+        """
         self.auth = auth
+        self.cache_ttls = cache_ttls or {}
+        self._cache: Dict[str, _CacheEntry] = {}
+        self.session_store = session_store
+        self._baby_id: Optional[str] = None
+
+    def clear_cache(self) -> None:
+        """Drop all cached responses"""
+        self._cache.clear()
+
+    async def _get_cached(self, endpoint: str, url: str, from_json: Callable[[Any], Any]) -> Any:
+        """GET url and parse its JSON body with from_json, caching the result according to the endpoint TTL"""
+        ttl = self.cache_ttls.get(endpoint)
+        entry = self._cache.get(url) if ttl is not None else None
+        now = time.monotonic()
+        if entry is not None and entry.expires_at > now:
+            return entry.value
+
+        headers = None
+        if entry is not None and entry.etag:
+            headers = {'If-None-Match': entry.etag}
+
+        async with self.auth.get(url, headers=headers) as resp:
+            if resp.status == 304 and entry is not None:
+                value = entry.value
+            else:
+                raise_for_status(resp)
+                value = await _decode(resp, endpoint, from_json)
+            if ttl is not None:
+                etag = resp.headers.get('ETag') or (entry.etag if entry is not None else None)
+                self._cache[url] = _CacheEntry(now + ttl, etag, value)
+            return value
 
     async def get_me(self) -> User:
         """Return Information about the current User"""
-        async with self.auth.get(SNOO_ME_ENDPOINT) as resp:
-            assert resp.status == 200
-            return User.from_dict(await resp.json())
+        return await self._get_cached(SNOO_ME_ENDPOINT, SNOO_ME_ENDPOINT, User.from_dict)
 
     async def get_devices(self) -> List[Device]:
         """Return Information about the configured devices"""
-        async with self.auth.get(SNOO_DEVICES_ENDPOINT) as resp:
-            assert resp.status == 200
-            resp_json = await resp.json()
-            return [Device.from_dict(d) for d in resp_json]
+        devices = await self._get_cached(SNOO_DEVICES_ENDPOINT, SNOO_DEVICES_ENDPOINT,
+                                         lambda resp_json: [Device.from_dict(d) for d in resp_json])
+        return list(devices)
 
     async def get_baby(self) -> Baby:
         """Return Information about the current User"""
-        async with self.auth.get(SNOO_BABY_ENDPOINT) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._get_cached(SNOO_BABY_ENDPOINT, SNOO_BABY_ENDPOINT, Baby.from_dict)
 
     async def get_last_session(self) -> LastSession:
         """Return Information about the last session"""
         async with self.auth.get(SNOO_SESSIONS_LAST_ENDPOINT) as resp:
-            assert resp.status == 200
-            return LastSession.from_dict(await resp.json())
+            raise_for_status(resp)
+            return await _decode(resp, SNOO_SESSIONS_LAST_ENDPOINT, LastSession.from_dict)
+
+    async def snapshot(self) -> Snapshot:
+        """Return user, devices, baby, last session and total session time in one call
+
+        All requests run concurrently. Only the total session time depends on the baby ID, so it
+        waits for the baby request unless the ID is known from an earlier call.
+        """
+        baby_task = asyncio.ensure_future(self.get_baby())
+
+        async def session_total_time() -> timedelta:
+            if self._baby_id is None:
+                self._baby_id = (await baby_task).baby
+            return await self.get_session_total_time(self._baby_id)
+
+        tasks = [asyncio.ensure_future(self.get_me()),
+                 asyncio.ensure_future(self.get_devices()),
+                 baby_task,
+                 asyncio.ensure_future(self.get_last_session()),
+                 asyncio.ensure_future(session_total_time())]
+        try:
+            user, devices, baby, last_session, total_time = await asyncio.gather(*tasks)
+        finally:
+            # Do not leave requests running if one of them failed.
+            for task in tasks:
+                task.cancel()
+        return Snapshot(user=user, devices=devices, baby=baby, last_session=last_session,
+                        session_total_time=total_time)
 
     async def get_aggregated_session(self, start_time: datetime) -> AggregatedSession:
         """Return Information about the aggregated session
@@ -59,14 +166,116 @@ class Snoo:
         This function returns information about the next 24h segment beginning from start_time.
         Note, start_time does not contain or respect a timezone property, but it will assume the
         timezone that is configured server-side.
+
+        With a session_store, segments that are over in every timezone are served from and written
+        to the store.
         """
+        return await self._get_aggregated_session(start_time)
+
+    async def _get_aggregated_session(self, start_time: datetime,
+                                      retry_policy: Optional[RetryPolicy] = None) -> AggregatedSession:
+        """get_aggregated_session, with a retry_policy replacing the one of the session"""
+        if self.session_store is None:
+            return AggregatedSession.from_dict(await self._fetch_aggregated_session(start_time, retry_policy))
+
+        baby = await self._get_baby_id()
+        # sqlite3 blocks, so the store is used from the default executor.
+        loop = asyncio.get_event_loop()
+        resp_json = await loop.run_in_executor(None, self.session_store.get, baby, start_time)
+        if resp_json is None:
+            resp_json = await self._fetch_aggregated_session(start_time, retry_policy)
+            # Only segments that are over are final. Compared as UTC, with a margin for the server-side timezone.
+            if start_time.tzinfo is None:
+                start_time_utc = start_time.replace(tzinfo=timezone.utc)
+            else:
+                start_time_utc = start_time
+            if start_time_utc + _SEGMENT_FINAL_AFTER <= datetime.now(timezone.utc):
+                await loop.run_in_executor(None, self.session_store.put, baby, start_time, resp_json)
+        return AggregatedSession.from_dict(resp_json)
+
+    async def _fetch_aggregated_session(self, start_time: datetime,
+                                        retry_policy: Optional[RetryPolicy] = None) -> dict:
+        """Return the raw aggregated session response of the 24h segment beginning from start_time"""
         url_params = {
             'startTime': start_time.strftime(DATETIME_FMT_AGGREGATED_SESSION)[:-3]
         }
         async with self.auth.get(SNOO_SESSIONS_AGGREGATED_ENDPOINT,
-                                 params=url_params) as resp:
-            assert resp.status == 200
-            return AggregatedSession.from_dict(await resp.json())
+                                 params=url_params, retry_policy=retry_policy) as resp:
+            raise_for_status(resp)
+            return await _decode(resp, SNOO_SESSIONS_AGGREGATED_ENDPOINT, lambda resp_json: resp_json)
+
+    async def _get_baby_id(self) -> str:
+        """Return the ID of the baby of the account (only requested once)"""
+        if self._baby_id is None:
+            self._baby_id = (await self.get_baby()).baby
+        return self._baby_id
+
+    async def get_aggregated_sessions(self,
+                                      start_time: datetime,
+                                      end_time: datetime,
+                                      max_concurrency: int = 4,
+                                      max_retries: int = 3,
+                                      retry_delay: float = 1.0
+                                      ) -> AsyncIterator[Tuple[datetime, AggregatedSession]]:
+        """Yield the aggregated sessions of all 24h segments between start_time and end_time
+
+        The segments are fetched concurrently, but yielded in date order as (segment start_time,
+        AggregatedSession) tuples. A failing segment is retried on its own with exponential backoff,
+        or after the Retry-After of a rate limit, during which no further segments are requested.
+        These retries replace the RetryPolicy of the session. A Retry-After longer than the last
+        backoff raises SnooRateLimitError.
+
+        :param start_time: start_time of the first 24h segment
+        :param end_time: segments starting at or after end_time are not fetched
+        :param max_concurrency: maximum number of concurrent requests
+        :param max_retries: number of retries per segment before giving up
+        :param retry_delay: delay in seconds before the first retry (doubled with every retry)
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        loop = asyncio.get_event_loop()
+        # Loop time until which no segment is requested. Shared by all segments and only ever moved
+        # forward, so that a rate limited API is not hammered.
+        resume_at = 0.0
+
+        async def fetch(segment_start: datetime) -> AggregatedSession:
+            nonlocal resume_at
+            attempt = 0
+            while True:
+                try:
+                    async with semaphore:
+                        while resume_at > loop.time():
+                            await asyncio.sleep(resume_at - loop.time())
+                        return await self._get_aggregated_session(segment_start, NO_RETRY)
+                except (SnooRateLimitError, SnooServerError, aiohttp.ClientError, asyncio.TimeoutError) as error:
+                    if attempt >= max_retries:
+                        raise
+                    delay = retry_delay * 2 ** attempt
+                    if isinstance(error, SnooRateLimitError) and error.retry_after is not None:
+                        if error.retry_after > retry_delay * 2 ** (max_retries - 1):
+                            raise
+                        delay = error.retry_after
+                    attempt += 1
+                    _LOGGER.debug('Fetching aggregated session %s failed (%r), retrying in %ss.',
+                                  segment_start, error, delay)
+                    resume_at = max(resume_at, loop.time() + delay)
+
+        segment_starts = []
+        segment_start = start_time
+        while segment_start < end_time:
+            segment_starts.append(segment_start)
+            segment_start += timedelta(days=1)
+
+        if self.session_store is not None:
+            # Resolve the store key once, instead of concurrently in every segment.
+            await self._get_baby_id()
+
+        tasks = [asyncio.ensure_future(fetch(segment_start)) for segment_start in segment_starts]
+        try:
+            for segment_start, task in zip(segment_starts, tasks):
+                yield segment_start, await task
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def get_aggregated_session_avg(self,
                                          baby: str,
@@ -88,8 +297,8 @@ class Snoo:
         }
         async with self.auth.get(SNOO_SESSIONS_AGGREGATED_AVG_ENDPOINT.format(baby),
                                  params=url_params) as resp:
-            assert resp.status == 200
-            return AggregatedSessionAvg.from_dict(await resp.json())
+            raise_for_status(resp)
+            return await _decode(resp, SNOO_SESSIONS_AGGREGATED_AVG_ENDPOINT, AggregatedSessionAvg.from_dict)
 
     async def get_session_total_time(self,
                                      baby: str) -> timedelta:
@@ -98,10 +307,20 @@ class Snoo:
         :param baby: ID of baby to get the total time for
         :return:
         """
-        async with self.auth.get(SNOO_SESSIONS_TOTAL_TIME_ENDPOINT.format(baby)) as resp:
-            assert resp.status == 200
-            resp_json = await resp.json()
-            return timedelta(seconds=resp_json.get('totalTime', 0))
+        return await self._get_cached(SNOO_SESSIONS_TOTAL_TIME_ENDPOINT,
+                                      SNOO_SESSIONS_TOTAL_TIME_ENDPOINT.format(baby),
+                                      lambda resp_json: timedelta(seconds=resp_json.get('totalTime', 0)))
+
+    async def _patch_baby(self, request_payload: dict) -> Baby:
+        """PATCH the baby endpoint and refresh the cached baby with the returned state"""
+        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
+            raise_for_status(resp)
+            baby = await _decode(resp, SNOO_BABY_ENDPOINT, Baby.from_dict)
+
+        ttl = self.cache_ttls.get(SNOO_BABY_ENDPOINT)
+        if ttl is not None:
+            self._cache[SNOO_BABY_ENDPOINT] = _CacheEntry(time.monotonic() + ttl, None, baby)
+        return baby
 
     async def set_baby_info(self,
                             baby_name: str,
@@ -119,9 +338,7 @@ class Snoo:
             'sex': sex
         }
 
-        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._patch_baby(request_payload)
 
     async def set_minimal_level(self,
                                 minimal_level: MinimalLevel) -> Baby:
@@ -132,9 +349,7 @@ class Snoo:
             }
         }
 
-        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._patch_baby(request_payload)
 
     async def set_minimal_level_volume(self,
                                        minimal_level_volume: MinimalLevelVolume) -> Baby:
@@ -145,9 +360,7 @@ class Snoo:
             }
         }
 
-        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._patch_baby(request_payload)
 
     async def set_responsiveness_level(self,
                                        responsiveness_level: ResponsivenessLevel) -> Baby:
@@ -158,9 +371,7 @@ class Snoo:
             }
         }
 
-        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._patch_baby(request_payload)
 
     async def set_soothing_level_volume(self,
                                         soothing_level_volume: SoothingLevelVolume) -> Baby:
@@ -171,9 +382,7 @@ class Snoo:
             }
         }
 
-        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._patch_baby(request_payload)
 
     async def set_motion_limiter(self,
                                  motion_limiter: bool) -> Baby:
@@ -184,9 +393,7 @@ class Snoo:
             }
         }
 
-        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._patch_baby(request_payload)
 
     async def set_weaning(self,
                           weaning: bool) -> Baby:
@@ -197,6 +404,4 @@ class Snoo:
             }
         }
 
-        async with self.auth.patch(SNOO_BABY_ENDPOINT, json=request_payload) as resp:
-            assert resp.status == 200
-            return Baby.from_dict(await resp.json())
+        return await self._patch_baby(request_payload)
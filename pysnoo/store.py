@@ -0,0 +1,56 @@
+"""PySnoo persistent store for historical data."""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+from .const import DATETIME_FMT_AGGREGATED_SESSION
+
+
+class AggregatedSessionStore:
+    """SQLite backed store of raw aggregated session responses, keyed by baby and segment start_time.
+
+    Only segments that are over should be stored, as the data of past days does not change anymore.
+    The store may be used from any thread, e.g. an executor of the event loop; calls are serialized.
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the store at path. Use ':memory:' for a non-persistent store."""
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS aggregated_sessions ('
+                'baby TEXT NOT NULL, '
+                'start_time TEXT NOT NULL, '
+                'data TEXT NOT NULL, '
+                'PRIMARY KEY (baby, start_time))')
+
+    @staticmethod
+    def _key(start_time: datetime) -> str:
+        """Return the storage key of start_time (same resolution as the API parameter)"""
+        return start_time.strftime(DATETIME_FMT_AGGREGATED_SESSION)[:-3]
+
+    def get(self, baby: str, start_time: datetime) -> Optional[dict]:
+        """Return the stored response for the segment starting at start_time or None"""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT data FROM aggregated_sessions WHERE baby = ? AND start_time = ?',
+                (baby, self._key(start_time))).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, baby: str, start_time: datetime, data: dict) -> None:
+        """Store the response for the segment starting at start_time"""
+        payload = json.dumps(data)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO aggregated_sessions (baby, start_time, data) VALUES (?, ?, ?)',
+                (baby, self._key(start_time), payload))
+
+    def close(self) -> None:
+        """Close the store"""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,108 @@
+"""TestClass for the Activity State Journal"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from asynctest import TestCase, MagicMock, patch
+
+from pysnoo import (ActivityStateJournalWriter, ActivityStateJournalReader,
+                    ActivityState, LazyActivityState)
+
+from tests.helpers import load_fixture
+
+
+class TestActivityStateJournal(TestCase):
+    """Activity State Journal Test class"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        payload = json.loads(load_fixture('', 'pubnub_message_ActivityState.json'))
+        self.states = [LazyActivityState(dict(payload, event_time_ms=second * 1000)) for second in range(10)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    async def _write(self, states, **kwargs):
+        writer = ActivityStateJournalWriter(self.directory, **kwargs)
+        for state in states:
+            writer.append(state)
+        await writer.close()
+
+    async def test_write_and_replay(self):
+        """Test that journaled states are replayed to listeners within the time range"""
+        # Small segments to force rotation
+        await self._write(self.states[:5], segment_size=1024)
+        # Eagerly decoded states are journaled as well
+        await self._write([state.decode() for state in self.states[5:]], segment_size=1024)
+        self.assertGreater(len(os.listdir(self.directory)), 2)
+
+        reader = ActivityStateJournalReader(self.directory, eager_decoding=False)
+        callback = MagicMock()
+        remove_cb = reader.add_listener(callback)
+
+        count = reader.replay(datetime(1970, 1, 1, 0, 0, 3, tzinfo=timezone.utc),
+                              datetime(1970, 1, 1, 0, 0, 8, tzinfo=timezone.utc))
+
+        self.assertEqual(count, 5)
+        self.assertEqual([mock_call[1][0] for mock_call in callback.mock_calls], self.states[3:8])
+        self.assertIsInstance(callback.mock_calls[0][1][0], LazyActivityState)
+
+        remove_cb()
+        self.assertEqual(reader.replay(), 10)
+        self.assertEqual(callback.call_count, 5)
+
+    async def test_truncated_record(self):
+        """Test that a truncated last record of a segment is skipped"""
+        await self._write(self.states[:3])
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(path, 'r+b') as segment:
+            segment.truncate(os.path.getsize(path) - 10)
+
+        # Writing after a restart starts a new segment
+        await self._write(self.states[3:4])
+
+        states = list(ActivityStateJournalReader(self.directory).iter_range())
+        self.assertEqual(states, [self.states[0], self.states[1], self.states[3]])
+        self.assertIsInstance(states[0], ActivityState)
+
+    @patch('os.fsync')
+    async def test_batched_fsync(self, mocked_fsync):
+        """Test that records are fsynced in batches"""
+        writer = ActivityStateJournalWriter(self.directory, fsync_interval=0.1, fsync_batch=3)
+        for state in self.states[:2]:
+            writer.append(state)
+        await asyncio.sleep(0.02)
+        mocked_fsync.assert_not_called()
+        writer.append(self.states[2])
+        await asyncio.sleep(0.02)
+        mocked_fsync.assert_called_once()
+
+        # Interval based fsync
+        writer.append(self.states[3])
+        await asyncio.sleep(0.2)
+        self.assertEqual(mocked_fsync.call_count, 2)
+        await writer.close()
+
+    async def test_sync_does_not_block_the_loop(self):
+        """Test that the event loop keeps running while an fsync is pending"""
+        fsync_done = threading.Event()
+        writer = ActivityStateJournalWriter(self.directory)
+        writer.append(self.states[0])
+
+        with patch('os.fsync', side_effect=lambda fd: fsync_done.wait(5)):
+            sync_task = asyncio.ensure_future(writer.sync())
+            start = self.loop.time()
+            await asyncio.sleep(0.01)
+            self.assertLess(self.loop.time() - start, 1)
+            self.assertFalse(sync_task.done())
+
+            fsync_done.set()
+            await sync_task
+            await writer.close()
+
+        states = list(ActivityStateJournalReader(self.directory).iter_range())
+        self.assertEqual(states, self.states[:1])
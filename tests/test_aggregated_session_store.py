@@ -0,0 +1,50 @@
+"""TestClass for the AggregatedSessionStore"""
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from pysnoo import AggregatedSessionStore
+
+from tests.helpers import load_fixture
+
+
+class TestAggregatedSessionStore(TestCase):
+    """AggregatedSessionStore Test class"""
+
+    def test_put_and_get(self):
+        """Test that stored responses are persisted per baby and start_time"""
+        aggregated_session_json = json.loads(load_fixture('', 'ss_v2_sessions_aggregated__get_200.json'))
+        start_time = datetime(2021, 2, 2, 7, 30, 45, 123456)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sessions.db')
+            store = AggregatedSessionStore(path)
+            self.assertIsNone(store.get('BABY_ID', start_time))
+            store.put('BABY_ID', start_time, aggregated_session_json)
+            store.close()
+
+            # Reopen
+            store = AggregatedSessionStore(path)
+            self.assertEqual(store.get('BABY_ID', start_time), aggregated_session_json)
+            # Keyed with millisecond resolution
+            self.assertEqual(store.get('BABY_ID', start_time.replace(microsecond=123000)), aggregated_session_json)
+            self.assertIsNone(store.get('OTHER_BABY_ID', start_time))
+            self.assertIsNone(store.get('BABY_ID', datetime(2021, 2, 3, 7, 30, 45, 123000)))
+            store.close()
+
+    def test_threads(self):
+        """Test that the store can be used from several threads"""
+        aggregated_session_json = json.loads(load_fixture('', 'ss_v2_sessions_aggregated__get_200.json'))
+        start_times = [datetime(2021, 2, 2, 7) + timedelta(days=day) for day in range(20)]
+        store = AggregatedSessionStore(':memory:')
+
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda start_time: store.put('BABY_ID', start_time, aggregated_session_json),
+                              start_times))
+            results = list(executor.map(lambda start_time: store.get('BABY_ID', start_time), start_times))
+
+        self.assertEqual(results, [aggregated_session_json] * len(start_times))
+        store.close()
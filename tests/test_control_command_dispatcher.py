@@ -0,0 +1,106 @@
+"""TestClass for the Control Command Dispatcher"""
+import asyncio
+
+from asynctest import TestCase, CoroutineMock, MagicMock
+
+from pysnoo import ControlCommandDispatcher, CommandResult
+
+
+class TestControlCommandDispatcher(TestCase):
+    """Control Command Dispatcher Test class"""
+
+    async def test_coalesce_go_to_state(self):
+        """Test that go_to_state commands within the window result in a single publish"""
+        publish = CoroutineMock(return_value='ENVELOPE')
+        dispatcher = ControlCommandDispatcher(publish, coalesce_window=0.05)
+        listener = MagicMock()
+        dispatcher.add_listener(listener)
+
+        results = await asyncio.gather(
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL1'}),
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL2', 'hold': 'on'}),
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL3'}))
+
+        publish.assert_called_once_with({'command': 'go_to_state', 'state': 'LEVEL3', 'hold': 'on'})
+        self.assertEqual([result.superseded for result in results], [True, True, False])
+        for result in results:
+            self.assertIsInstance(result, CommandResult)
+            self.assertEqual(result.envelope, 'ENVELOPE')
+            self.assertEqual(result.message, {'command': 'go_to_state', 'state': 'LEVEL3', 'hold': 'on'})
+            self.assertGreaterEqual(result.latency, result.publish_latency)
+        # Held back for the coalesce window
+        self.assertGreaterEqual(results[0].latency, 0.04)
+        self.assertEqual(listener.call_count, 3)
+        self.assertEqual(dispatcher.pending, 0)
+
+    async def test_order_and_barrier(self):
+        """Test that other commands keep their position and are not coalesced"""
+        published = []
+
+        async def publish(message):
+            published.append(message)
+            await asyncio.sleep(0.01)
+
+        dispatcher = ControlCommandDispatcher(publish, coalesce_window=0.01)
+
+        await asyncio.gather(
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL1'}),
+            dispatcher.submit({'command': 'start_snoo'}),
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL2'}),
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL3'}))
+
+        self.assertEqual(published, [{'command': 'go_to_state', 'state': 'LEVEL1'},
+                                     {'command': 'start_snoo'},
+                                     {'command': 'go_to_state', 'state': 'LEVEL3'}])
+
+    async def test_bounded_pipeline(self):
+        """Test the in-flight and pending limits"""
+        running = 0
+        max_running = 0
+        release = asyncio.Event()
+
+        async def publish(_):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await release.wait()
+            running -= 1
+
+        dispatcher = ControlCommandDispatcher(publish, max_in_flight=2, max_pending=2)
+        submits = [asyncio.ensure_future(dispatcher.submit({'command': 'start_snoo'})) for _ in range(6)]
+        await asyncio.sleep(0.01)
+
+        # 2 in flight, 2 pending and 2 waiting for room
+        self.assertEqual(running, 2)
+        self.assertEqual(dispatcher.pending, 2)
+        self.assertFalse(any(submit.done() for submit in submits))
+
+        release.set()
+        await asyncio.gather(*submits)
+        self.assertEqual(max_running, 2)
+
+    async def test_publish_error(self):
+        """Test that publish errors are raised to all folded submits"""
+        publish = CoroutineMock(side_effect=ValueError('publish failed'))
+        dispatcher = ControlCommandDispatcher(publish, coalesce_window=0.01)
+
+        results = await asyncio.gather(
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL1'}),
+            dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL2'}),
+            return_exceptions=True)
+
+        publish.assert_called_once()
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+
+    async def test_close(self):
+        """Test that close cancels queued commands"""
+        dispatcher = ControlCommandDispatcher(CoroutineMock(), coalesce_window=10)
+        submit = asyncio.ensure_future(dispatcher.submit({'command': 'go_to_state', 'state': 'LEVEL1'}))
+        await asyncio.sleep(0)
+
+        await dispatcher.close()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await submit
+        self.assertEqual(dispatcher.pending, 0)
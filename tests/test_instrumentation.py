@@ -0,0 +1,136 @@
+"""TestClass for the Instrumentation hooks"""
+import json
+
+from pubnub.models.consumer.pubsub import PNMessageResult
+
+from asynctest import TestCase, patch, CoroutineMock, MagicMock
+from pysnoo import (SnooAuthSession, Snoo, SnooPubNub, User, Instrumentation, InstrumentationEvent, INSTRUMENTATION,
+                    HistogramCollector, PrometheusHistogramAdapter)
+from pysnoo.const import SNOO_ME_ENDPOINT
+from pysnoo.instrumentation import (EVENTS, REQUEST_START, REQUEST_END, RESPONSE_DECODE, ACTIVITY_STATE_DECODE,
+                                    LISTENER_DISPATCH)
+
+from tests.helpers import load_fixture, get_token
+
+
+class TestInstrumentation(TestCase):
+    """Instrumentation Test class"""
+
+    def setUp(self):
+        self.events = []
+        self.remove_hooks = INSTRUMENTATION.add_hooks(self.events.append)
+
+    def tearDown(self):
+        self.remove_hooks()
+
+    def test_add_and_remove_hook(self):
+        """Test the hook registry"""
+        instrumentation = Instrumentation()
+        hook = MagicMock()
+        remove_cb = instrumentation.add_hook(REQUEST_END, hook)
+        self.assertEqual(instrumentation.hooks[REQUEST_END], (hook,))
+        self.assertEqual(instrumentation.hooks[REQUEST_START], ())
+
+        instrumentation.emit(REQUEST_END, 0.5, method='GET')
+        hook.assert_called_once_with(InstrumentationEvent(REQUEST_END, 0.5, {'method': 'GET'}))
+
+        remove_cb()
+        self.assertEqual(instrumentation.hooks[REQUEST_END], ())
+        with self.assertRaises(ValueError):
+            instrumentation.add_hook('unknown', hook)
+
+    def test_failing_hook(self):
+        """Test that a failing hook does not stop the others"""
+        instrumentation = Instrumentation()
+        hook = MagicMock()
+        instrumentation.add_hook(REQUEST_END, MagicMock(side_effect=RuntimeError))
+        instrumentation.add_hook(REQUEST_END, hook)
+        with self.assertLogs('pysnoo.instrumentation', 'ERROR'):
+            instrumentation.emit(REQUEST_END, 0.5)
+        hook.assert_called_once()
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_request_events(self, mocked_request):
+        """Test the events of a Snoo API request"""
+        token, _ = get_token()
+        user_json = json.loads(load_fixture('', 'us_me__get_200.json'))
+        mocked_request.return_value.json = CoroutineMock(return_value=user_json)
+        mocked_request.return_value.status = 200
+
+        async with SnooAuthSession(token) as session:
+            user = await Snoo(session).get_me()
+
+        self.assertIsInstance(user, User)
+        self.assertEqual([event.name for event in self.events], [REQUEST_START, REQUEST_END, RESPONSE_DECODE])
+        self.assertEqual(self.events[0], InstrumentationEvent(REQUEST_START, None,
+                                                              {'method': 'GET', 'url': SNOO_ME_ENDPOINT}))
+        self.assertEqual(self.events[1].labels,
+                         {'method': 'GET', 'url': SNOO_ME_ENDPOINT, 'status': '200', 'error': ''})
+        self.assertGreaterEqual(self.events[1].duration, 0)
+        self.assertEqual(self.events[2].labels, {'endpoint': SNOO_ME_ENDPOINT})
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_failed_request_event(self, mocked_request):
+        """Test the REQUEST_END event of a failing request"""
+        token, _ = get_token()
+        mocked_request.side_effect = ConnectionResetError()
+
+        async with SnooAuthSession(token, retry_policy=None) as session:
+            with self.assertRaises(ConnectionResetError):
+                await Snoo(session).get_me()
+
+        self.assertEqual([event.name for event in self.events], [REQUEST_START, REQUEST_END])
+        self.assertEqual(self.events[1].labels['error'], 'ConnectionResetError')
+
+    async def test_pubnub_events(self):
+        """Test the decode and dispatch events of a PubNub message"""
+        # pylint: disable=protected-access
+        pubnub = SnooPubNub('ACCESS_TOKEN', 'SERIAL_NUMBER', 'UUID', custom_event_loop=self.loop, eager_decoding=True)
+        callback = MagicMock()
+        pubnub.add_listener(callback)
+        pubnub._listener.message(pubnub._pubnub, PNMessageResult(
+            json.loads(load_fixture('', 'pubnub_message_ActivityState.json')), None, 'ActivityState.SERIAL_NUMBER', 0))
+        await pubnub.stop()
+
+        callback.assert_called_once()
+        self.assertEqual([event.name for event in self.events], [ACTIVITY_STATE_DECODE, LISTENER_DISPATCH])
+        self.assertEqual(self.events[0].labels, {'channel': 'ActivityState.SERIAL_NUMBER'})
+        self.assertEqual(self.events[1].labels, {'channel': 'ActivityState.SERIAL_NUMBER', 'listeners': '1'})
+
+    def test_histogram_collector(self):
+        """Test the Prometheus exposition of the histogram collector"""
+        collector = HistogramCollector(buckets=(0.1, 1.0), label_names=('status',))
+        collector(InstrumentationEvent(REQUEST_START, None, {'status': ''}))
+        collector(InstrumentationEvent(REQUEST_END, 0.05, {'status': '200', 'url': 'https://example.com'}))
+        collector(InstrumentationEvent(REQUEST_END, 0.5, {'status': '200', 'url': 'https://example.com'}))
+        collector(InstrumentationEvent(REQUEST_END, 2.0, {'status': '503'}))
+
+        self.assertEqual(len(collector.histograms), 2)
+        self.assertEqual(collector.exposition('snoo'), '\n'.join([
+            '# TYPE snoo_request_end_seconds histogram',
+            'snoo_request_end_seconds_bucket{status="200",le="0.1"} 1',
+            'snoo_request_end_seconds_bucket{status="200",le="1.0"} 2',
+            'snoo_request_end_seconds_bucket{status="200",le="+Inf"} 2',
+            'snoo_request_end_seconds_sum{status="200"} 0.55',
+            'snoo_request_end_seconds_count{status="200"} 2',
+            'snoo_request_end_seconds_bucket{status="503",le="0.1"} 0',
+            'snoo_request_end_seconds_bucket{status="503",le="1.0"} 0',
+            'snoo_request_end_seconds_bucket{status="503",le="+Inf"} 1',
+            'snoo_request_end_seconds_sum{status="503"} 2.0',
+            'snoo_request_end_seconds_count{status="503"} 1',
+        ]) + '\n')
+        self.assertEqual(HistogramCollector().exposition(), '')
+
+    def test_prometheus_histogram_adapter(self):
+        """Test the adapter for prometheus_client histograms"""
+        histogram = MagicMock()
+        PrometheusHistogramAdapter(histogram)(InstrumentationEvent(RESPONSE_DECODE, 0.25, {}))
+        histogram.observe.assert_called_once_with(0.25)
+
+        histogram = MagicMock()
+        adapter = PrometheusHistogramAdapter(histogram, ('method', 'status'))
+        adapter(InstrumentationEvent(REQUEST_START, None, {'method': 'GET'}))
+        adapter(InstrumentationEvent(REQUEST_END, 0.25, {'method': 'GET'}))
+        histogram.labels.assert_called_once_with('GET', '')
+        histogram.labels.return_value.observe.assert_called_once_with(0.25)
+        self.assertEqual(len(EVENTS), 6)
@@ -0,0 +1,30 @@
+"""TestClass for the lazy imports of the pysnoo package"""
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+import pysnoo
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+class TestLazyImports(TestCase):
+    """Lazy Imports Test class"""
+
+    def test_import_does_not_import_heavy_packages(self):
+        """Test that importing pysnoo and its models does not import aiohttp, oauthlib or pubnub"""
+        code = ('import sys, pysnoo\n'
+                'from pysnoo import ActivityState, SessionLevel\n'
+                'print(",".join(p for p in ("aiohttp", "oauthlib", "pubnub") if p in sys.modules))')
+        result = subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=ROOT),
+                                check=True, stdout=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_public_names(self):
+        """Test that all public names resolve"""
+        for name in pysnoo.__all__:
+            self.assertIsNotNone(getattr(pysnoo, name))
+        self.assertTrue(set(pysnoo.__all__) <= set(dir(pysnoo)))
+        with self.assertRaises(AttributeError):
+            getattr(pysnoo, 'DoesNotExist')
@@ -0,0 +1,30 @@
+"""TestClass for the Metrics"""
+import math
+from unittest import TestCase
+
+from pysnoo import LatencyHistogram
+
+
+class TestMetrics(TestCase):
+    """Metrics Test class"""
+
+    def test_latency_histogram(self):
+        """Test latency histogram buckets and quantiles"""
+        histogram = LatencyHistogram(buckets=(1.0, 0.1, 0.5))
+        self.assertTrue(math.isnan(histogram.quantile(0.5)))
+
+        for value in (0.05, 0.1, 0.3, 0.7, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.buckets, (0.1, 0.5, 1.0))
+        self.assertEqual(histogram.cumulative_counts(), {0.1: 2, 0.5: 3, 1.0: 4, '+Inf': 5})
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.sum, 3.15)
+        self.assertEqual(histogram.quantile(0.5), 0.5)
+        self.assertEqual(histogram.quantile(0.8), 1.0)
+        self.assertEqual(histogram.quantile(0.99), float('inf'))
+        self.assertEqual(histogram.to_dict(), {
+            'buckets': {0.1: 2, 0.5: 3, 1.0: 4, '+Inf': 5},
+            'count': 5,
+            'sum': histogram.sum
+        })
@@ -1,6 +1,8 @@
 """TestClass for all Snoo Models"""
 
+import copy
 import json
+import pickle
 from unittest import TestCase
 from datetime import datetime, timedelta, timezone
 
@@ -11,10 +13,13 @@ from pysnoo import (User, Device, Baby, LastSession,
                     MinimalLevel,
                     SessionLevel,
                     AggregatedSession,
+                    AggregatedSessionColumns,
                     SessionItemType,
                     AggregatedSessionAvg,
                     ActivityState)
-
+from pysnoo.models import (dt_str_to_dt, _dt_str_to_dt_strptime,  # pylint: disable=protected-access
+                           aggregated_dt_str_to_dt, EventType, LazyActivityState)
+from pysnoo.const import DATETIME_FMT_AGGREGATED_SESSION
 
 from .helpers import load_fixture
 
@@ -301,3 +306,109 @@ class TestSnooModels(TestCase):
         self.assertFalse(SessionLevel.ONLINE.is_active_level())
         self.assertFalse(SessionLevel.NONE.is_active_level())
         self.assertFalse(SessionLevel.PRETIMEOUT.is_active_level())
+
+    def test_dt_str_to_dt_matches_strptime(self):
+        """Test that the fast path of dt_str_to_dt is identical to the strptime implementation"""
+        for dt_str in ['2021-02-13T16:02:40.628Z',
+                       '2021-02-13T16:02:40.6Z',
+                       '2021-02-13T16:02:40.62',
+                       '2021-02-13T16:02:40.628123456Z',
+                       '2021-02-13T16:02:40Z',
+                       '2021-02-13T16:02:40',
+                       '2021-2-13T16:02:40',
+                       '2021-01-17']:
+            try:
+                expected = _dt_str_to_dt_strptime(dt_str)
+            except ValueError:
+                with self.assertRaises(ValueError):
+                    dt_str_to_dt(dt_str)
+                continue
+            actual = dt_str_to_dt(dt_str)
+            self.assertEqual(actual, expected, dt_str)
+            self.assertIs(actual.tzinfo, expected.tzinfo, dt_str)
+
+        self.assertIsNone(dt_str_to_dt(None))
+        with self.assertRaises(ValueError):
+            dt_str_to_dt('2021-02-30T16:02:40Z')
+
+    def test_aggregated_dt_str_to_dt_matches_strptime(self):
+        """Test that aggregated_dt_str_to_dt is identical to strptime with DATETIME_FMT_AGGREGATED_SESSION"""
+        for dt_str in ['2021-01-30 07:00:00.000', '2021-01-31 05:35:16.214', '2021-01-31 05:35:16.2',
+                       '2021-01-31 05:35:16.123456']:
+            self.assertEqual(aggregated_dt_str_to_dt(dt_str),
+                             datetime.strptime(dt_str, DATETIME_FMT_AGGREGATED_SESSION), dt_str)
+
+        for dt_str in ['2021-01-31 05:35:16', '2021-01-31 05:35:16.1234567', '2021-01-32 05:35:16.000']:
+            with self.assertRaises(ValueError):
+                aggregated_dt_str_to_dt(dt_str)
+
+    def test_aggregated_session_columns(self):
+        """Test that the columnar aggregations match the AggregatedSession objects"""
+        aggregated_session_payload = json.loads(load_fixture('', 'ss_v2_sessions_aggregated__get_200.json'))
+        aggregated_session = AggregatedSession.from_dict(aggregated_session_payload)
+        columns = AggregatedSessionColumns.from_dicts([aggregated_session_payload, aggregated_session_payload])
+        levels = aggregated_session.levels * 2
+
+        self.assertEqual(len(columns), len(levels))
+        self.assertEqual(list(columns.start_time),
+                         [(item.start_time - datetime(1970, 1, 1)).total_seconds() for item in levels])
+        self.assertEqual(list(columns.is_active), [int(item.is_active) for item in levels])
+
+        for item_type in SessionItemType:
+            self.assertEqual(columns.duration_by_type()[item_type],
+                             sum((item.state_duration for item in levels if item.type == item_type), timedelta()))
+            self.assertEqual(columns.count_by_type()[item_type],
+                             len([item for item in levels if item.type == item_type]))
+
+        sleep_per_day = {}
+        for item in levels:
+            if item.type == SessionItemType.ASLEEP:
+                day = item.start_time.date()
+                sleep_per_day[day] = sleep_per_day.get(day, timedelta()) + item.state_duration
+        self.assertEqual(columns.duration_per_day(), sleep_per_day)
+
+        # Levels without start time count per type, but not per day
+        asleep = columns.duration_by_type()[SessionItemType.ASLEEP]
+        columns.extend({'levels': [{'type': 'asleep', 'stateDuration': 60}]})
+        self.assertEqual(columns.duration_by_type()[SessionItemType.ASLEEP], asleep + timedelta(seconds=60))
+        self.assertEqual(columns.duration_per_day(), sleep_per_day)
+
+    def test_slotted_models(self):
+        """Test that models have no instance __dict__, but can be copied and pickled"""
+        activity_state_payload = json.loads(load_fixture('', 'pubnub_message_ActivityState.json'))
+        activity_state = ActivityState.from_dict(activity_state_payload)
+
+        self.assertFalse(hasattr(activity_state, '__dict__'))
+        self.assertFalse(hasattr(activity_state.state_machine, '__dict__'))
+        self.assertFalse(hasattr(activity_state.rx_signal, '__dict__'))
+
+        self.assertEqual(copy.copy(activity_state), activity_state)
+        self.assertEqual(copy.deepcopy(activity_state), activity_state)
+        self.assertEqual(pickle.loads(pickle.dumps(activity_state)), activity_state)
+
+    def test_lazy_activity_state(self):
+        """Test that LazyActivityState decodes on access and matches ActivityState"""
+        activity_state_payload = json.loads(load_fixture('', 'pubnub_message_ActivityState.json'))
+        activity_state = ActivityState.from_dict(activity_state_payload)
+        lazy_activity_state = LazyActivityState(activity_state_payload)
+
+        # pylint: disable=protected-access
+        self.assertEqual(lazy_activity_state._decoded, {})
+        self.assertEqual(lazy_activity_state.event, activity_state.event)
+        self.assertIsInstance(lazy_activity_state.event, EventType)
+        self.assertEqual(list(lazy_activity_state._decoded), ['event'])
+
+        self.assertEqual(lazy_activity_state, activity_state)
+        self.assertEqual(activity_state, lazy_activity_state)
+        self.assertEqual(lazy_activity_state.decode(), activity_state)
+        self.assertEqual(hash(lazy_activity_state), hash(activity_state))
+        self.assertEqual(lazy_activity_state.to_dict(), activity_state.to_dict())
+
+    def test_activity_state_to_message(self):
+        """Test that to_message returns the PubNub message payload"""
+        activity_state_payload = json.loads(load_fixture('', 'pubnub_message_ActivityState.json'))
+        activity_state = ActivityState.from_dict(activity_state_payload)
+
+        self.assertEqual(activity_state.to_message(), activity_state_payload)
+        self.assertEqual(ActivityState.from_dict(activity_state.to_message()), activity_state)
+        self.assertIs(LazyActivityState(activity_state_payload).to_message(), activity_state_payload)
@@ -3,8 +3,10 @@
 
 This ideally moves into a separate library. (along with the base class).
 """
+import asyncio
+
 from aiohttp import BasicAuth
-from asynctest import TestCase, patch, CoroutineMock, MagicMock, call
+from asynctest import TestCase, patch, CoroutineMock, MagicMock, call, ANY
 from callee import Contains
 
 from pysnoo.oauth2_session import OAuth2Session, TokenUpdated, TokenExpiredError, InsecureTransportError
@@ -221,6 +223,38 @@ class TestOAuth2hSession(TestCase):
                     response_body = await resp.text()
                     self.assertEqual('test', response_body)
 
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_refresh_expired_token_single_flight(self, mocked_request):
+        """Test that concurrent requests with an expired token share a single refresh"""
+        token, token_string = get_token(-10)
+
+        mocked_tocken_updater = MagicMock()
+
+        responses = iter([token_string, 'test', 'test', 'test'])
+
+        async def slow_text():
+            # Yield to the event loop, so that the other requests hit the expired token meanwhile.
+            await asyncio.sleep(0.01)
+            return next(responses)
+
+        # Token Refresh POST, followed by the three GETs
+        mocked_request.return_value.text = slow_text
+
+        async with OAuth2Session(client_id=TEST_CLIENT_ID, auto_refresh_url=TOKEN_REFRESH_ENDPOINT,
+                                 token=token, token_updater=mocked_tocken_updater) as oauth_session:
+
+            async def get_text():
+                async with oauth_session.get(TEST_API_URI) as resp:
+                    return await resp.text()
+
+            responses = await asyncio.gather(get_text(), get_text(), get_text())
+            self.assertEqual(['test', 'test', 'test'], responses)
+
+        refresh_calls = [c for c in mocked_request.mock_calls if c == call(
+            'POST', TOKEN_REFRESH_ENDPOINT, data=ANY, timeout=None, headers=ANY, auth=None, verify_ssl=True)]
+        self.assertEqual(1, len(refresh_calls))
+        mocked_tocken_updater.assert_called_once_with(Contains('access_token'))
+
     async def test_refresh_expired_token_without_auto_refresh_url(self):
         """Test the automatic refresh of an expired token without an auto_refresh_url"""
         token, _ = get_token(-10)
@@ -0,0 +1,30 @@
+"""TestClass for the Retry Policy"""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import TestCase
+
+from pysnoo import RetryPolicy
+
+
+class TestRetryPolicy(TestCase):
+    """Retry Policy Test class"""
+
+    def test_backoff(self):
+        """Test exponential backoff with cap and jitter"""
+        policy = RetryPolicy(backoff_base=1, backoff_max=5, jitter=False)
+        self.assertEqual([policy.backoff(retry) for retry in range(1, 6)], [1, 2, 4, 5, 5])
+
+        policy = RetryPolicy(backoff_base=1, backoff_max=5)
+        for retry in range(1, 6):
+            self.assertTrue(0 <= policy.backoff(retry) <= min(5, 2 ** (retry - 1)))
+
+    def test_retry_after(self):
+        """Test parsing of the Retry-After header"""
+        self.assertIsNone(RetryPolicy.retry_after({}))
+        self.assertEqual(RetryPolicy.retry_after({'Retry-After': '3'}), 3)
+        self.assertEqual(RetryPolicy.retry_after({'Retry-After': '-3'}), 0)
+        self.assertIsNone(RetryPolicy.retry_after({'Retry-After': 'soon'}))
+
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+        delay = RetryPolicy.retry_after({'Retry-After': format_datetime(retry_at, usegmt=True)})
+        self.assertTrue(28 <= delay <= 30)
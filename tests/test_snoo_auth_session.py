@@ -1,6 +1,8 @@
 """TestClass for the SnooAuthSession (and underlying OAuthBaseSession)"""
+import asyncio
 import json
 
+import aiohttp
 from asynctest import TestCase, patch, CoroutineMock, ANY, MagicMock
 from callee import Contains
 from oauthlib.oauth2 import OAuth2Error
@@ -10,6 +12,7 @@ from pysnoo.const import (OAUTH_LOGIN_ENDPOINT,
                           SNOO_API_URI,
                           BASE_HEADERS)
 from pysnoo.auth_session import SnooAuthSession
+from pysnoo.connector import ConnectorConfig
 
 from tests.helpers import load_fixture, get_token
 
@@ -79,3 +82,95 @@ class TestSnooAuthSession(TestCase):
 
         # Check that token_updater function was called with new TOKEN
         mocked_tocken_updater.assert_called_once_with(Contains('access_token'))
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_background_token_renewal(self, mocked_request):
+        """Test the renewal of a token ahead of its expiry"""
+        token, token_response = get_token(2)
+
+        mocked_tocken_updater = MagicMock()
+
+        # Token Refresh POST
+        mocked_request.return_value.text = CoroutineMock(side_effect=[token_response])
+
+        async with SnooAuthSession(token=token, token_updater=mocked_tocken_updater,
+                                   token_renewal_margin=1.9) as session:
+            # oauthlib rounds expires_at to full seconds, renewal is due in at most 0.6s.
+            await asyncio.sleep(1)
+            mocked_request.assert_called_once_with(
+                'POST', OAUTH_TOKEN_REFRESH_ENDPOINT,
+                data=json.dumps({'grant_type': 'refresh_token',
+                                 'refresh_token': token['refresh_token']}),
+                timeout=None,
+                headers={'Accept': 'application/json', 'Content-Type': 'application/json;charset=UTF-8'},
+                auth=None,
+                verify_ssl=True)
+            mocked_tocken_updater.assert_called_once_with(Contains('access_token'))
+            self.assertEqual(session.token['expires_in'], 10800)
+
+        # pylint: disable=protected-access
+        self.assertIsNone(session._token_renewal_task)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_token_renewal_of_short_lived_tokens(self, mocked_request):
+        """Test that a token living shorter than the renewal margin is not renewed in a loop"""
+        token, token_response = get_token(2)
+        refreshed_token = dict(json.loads(token_response), expires_in=2)
+        mocked_request.return_value.text = CoroutineMock(return_value=json.dumps(refreshed_token))
+
+        async with SnooAuthSession(token=token, token_updater=MagicMock(),
+                                   token_renewal_margin=300) as session:
+            await asyncio.sleep(0.5)
+            mocked_request.assert_called_once()
+            self.assertEqual(session.token['expires_in'], 2)
+
+    @patch('pysnoo.oauth2_session.TOKEN_RENEWAL_RETRY_DELAY', 0.01)
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_token_renewal_survives_errors(self, mocked_request):
+        """Test that the background renewal keeps running after an unexpected error"""
+        token, token_response = get_token(1)
+        refreshed_token = dict(json.loads(token_response), expires_in=1)
+        mocked_request.return_value.text = CoroutineMock(return_value=json.dumps(refreshed_token))
+        mocked_tocken_updater = MagicMock(side_effect=[RuntimeError('Disk full'), None])
+
+        async with SnooAuthSession(token=token, token_updater=mocked_tocken_updater,
+                                   token_renewal_margin=1.9):
+            with self.assertLogs('pysnoo.oauth2_session', 'ERROR'):
+                await asyncio.sleep(0.2)
+            self.assertEqual(mocked_request.call_count, 2)
+            self.assertEqual(mocked_tocken_updater.call_count, 2)
+
+    async def test_connector_config(self):
+        """Test the connection pool settings of the session connector"""
+        config = ConnectorConfig(limit=10, limit_per_host=4, keepalive_timeout=30.0, ttl_dns_cache=600)
+        async with SnooAuthSession(connector_config=config) as session:
+            connector = session.connector
+            self.assertIsInstance(connector, aiohttp.TCPConnector)
+            self.assertEqual(connector.limit, 10)
+            self.assertEqual(connector.limit_per_host, 4)
+            # pylint: disable=protected-access
+            self.assertEqual(connector._keepalive_timeout, 30.0)
+            self.assertEqual(connector._cached_hosts._ttl, 600)
+        # Owned by the session
+        self.assertTrue(connector.closed)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_warm_up(self, mocked_request):
+        """Test that warm_up sends concurrent HEAD requests without token"""
+        token, _ = get_token()
+        mocked_request.return_value.read = CoroutineMock()
+        async with SnooAuthSession(token=token) as session:
+            self.assertEqual(await session.warm_up(3), 3)
+            self.assertEqual(mocked_request.call_count, 3)
+            mocked_request.assert_called_with(
+                'HEAD', SNOO_API_URI + '/',
+                data=None,
+                allow_redirects=False,
+                timeout=ANY,
+                headers=None)
+
+            # Failures are counted, not raised, and not retried
+            mocked_request.reset_mock()
+            mocked_request.side_effect = aiohttp.ClientConnectionError()
+            self.assertEqual(await session.warm_up(2), 0)
+            self.assertEqual(mocked_request.call_count, 2)
@@ -1,27 +1,42 @@
 """TestClass for the Snoo Client"""
+import asyncio
 import json
 from datetime import date, datetime, timedelta
 
-from asynctest import TestCase, patch, CoroutineMock
+import aiohttp
+
+from asynctest import TestCase, patch, CoroutineMock, MagicMock, call
 from pysnoo.const import (SNOO_ME_ENDPOINT, SNOO_DEVICES_ENDPOINT, SNOO_BABY_ENDPOINT,
                           SNOO_SESSIONS_LAST_ENDPOINT,
                           SNOO_SESSIONS_AGGREGATED_ENDPOINT,
                           SNOO_SESSIONS_AGGREGATED_AVG_ENDPOINT,
                           SNOO_SESSIONS_TOTAL_TIME_ENDPOINT)
-from pysnoo import (SnooAuthSession, Snoo,
+from pysnoo.snoo import DEFAULT_CACHE_TTLS
+from pysnoo import (SnooAuthSession, Snoo, AggregatedSessionStore,
                     MinimalLevel,
                     MinimalLevelVolume,
                     ResponsivenessLevel,
                     SoothingLevelVolume,
                     User, Device, Baby, Sex,
                     LastSession,
+                    Snapshot,
                     AggregatedSession,
-                    AggregatedSessionAvg)
+                    AggregatedSessionAvg,
+                    RetryPolicy, SnooApiError, SnooAuthenticationError, SnooRateLimitError, SnooServerError)
 
 from tests.helpers import load_fixture, get_token
 
 
-class TestSnooClient(TestCase):
+def _response(status, resp_json=None, headers=None):
+    """Return a mocked aiohttp response"""
+    resp = MagicMock()
+    resp.status = status
+    resp.headers = headers or {}
+    resp.json = CoroutineMock(return_value=resp_json)
+    return resp
+
+
+class TestSnooClient(TestCase):  # pylint: disable=too-many-public-methods
     """Snoo Client Test class"""
 
     @patch('aiohttp.client.ClientSession._request')
@@ -125,6 +140,125 @@ class TestSnooClient(TestCase):
             # Check Response
             self.assertEqual(aggregated_session, AggregatedSession.from_dict(aggregated_session_json))
 
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_get_aggregated_sessions(self, mocked_request):
+        """Test the concurrent GET /ss/v2/sessions/aggregated of a date range with a retried segment"""
+        # Setup
+        token, _ = get_token()
+        aggregated_session_json = json.loads(load_fixture('', 'ss_v2_sessions_aggregated__get_200.json'))
+        # The first request fails and is retried.
+        mocked_request.return_value.json = CoroutineMock(
+            side_effect=[aiohttp.ClientPayloadError()] + [aggregated_session_json] * 3)
+        mocked_request.return_value.status = 200
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session)
+            # Test
+            results = [item async for item in snoo.get_aggregated_sessions(
+                datetime(2021, 2, 1, 7), datetime(2021, 2, 4, 7), max_concurrency=2, retry_delay=0)]
+
+            # Check Request
+            self.assertEqual(mocked_request.call_count, 4)
+            self.assertEqual(sorted(c[1]['params']['startTime'] for c in mocked_request.call_args_list),
+                             ['2021-02-01 07:00:00.000', '2021-02-01 07:00:00.000',
+                              '2021-02-02 07:00:00.000', '2021-02-03 07:00:00.000'])
+
+            # Check Response
+            self.assertEqual([start_time for start_time, _ in results],
+                             [datetime(2021, 2, 1, 7), datetime(2021, 2, 2, 7), datetime(2021, 2, 3, 7)])
+            for _, aggregated_session in results:
+                self.assertEqual(aggregated_session, AggregatedSession.from_dict(aggregated_session_json))
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_get_aggregated_sessions_rate_limited(self, mocked_request):
+        """Test that segments are retried after Retry-After, without the retries of the session"""
+        # Setup
+        token, _ = get_token()
+        aggregated_session_json = json.loads(load_fixture('', 'ss_v2_sessions_aggregated__get_200.json'))
+        mocked_request.side_effect = [_response(503),
+                                      _response(429, headers={'Retry-After': '0.01'}),
+                                      _response(200, aggregated_session_json),
+                                      _response(429, headers={'Retry-After': '3600'})]
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session)
+            # Test
+            results = [item async for item in snoo.get_aggregated_sessions(
+                datetime(2021, 2, 1, 7), datetime(2021, 2, 2, 7), retry_delay=0.01)]
+            # A Retry-After beyond the last backoff is not waited for
+            with self.assertRaises(SnooRateLimitError):
+                _ = [item async for item in snoo.get_aggregated_sessions(
+                    datetime(2021, 2, 2, 7), datetime(2021, 2, 3, 7), retry_delay=0.01)]
+
+            # Check
+            self.assertEqual(mocked_request.call_count, 4)
+            self.assertEqual(results, [(datetime(2021, 2, 1, 7), AggregatedSession.from_dict(aggregated_session_json))])
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_get_aggregated_sessions_longest_retry_after(self, mocked_request):
+        """Test that no segment is requested before the longest pending Retry-After is over"""
+        # Setup
+        token, _ = get_token()
+        aggregated_session_json = json.loads(load_fixture('', 'ss_v2_sessions_aggregated__get_200.json'))
+        retry_after = {'2021-02-01 07:00:00.000': '0.2', '2021-02-02 07:00:00.000': '0.02'}
+        request_times = []
+
+        async def request(*_args, params, **_kwargs):
+            request_times.append(self.loop.time())
+            # Both segments are in flight before the first response
+            await asyncio.sleep(0.01)
+            start_time = params['startTime']
+            if start_time in retry_after:
+                return _response(429, headers={'Retry-After': retry_after.pop(start_time)})
+            return _response(200, aggregated_session_json)
+
+        mocked_request.side_effect = request
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session)
+            # Test
+            results = [item async for item in snoo.get_aggregated_sessions(
+                datetime(2021, 2, 1, 7), datetime(2021, 2, 3, 7), retry_delay=0.1)]
+
+            # Check
+            self.assertEqual(len(results), 2)
+            self.assertEqual(len(request_times), 4)
+            # Both segments failed right away, and both waited for the longer Retry-After
+            self.assertLess(request_times[1] - request_times[0], 0.1)
+            self.assertGreaterEqual(min(request_times[2:]) - request_times[0], 0.2)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_get_aggregated_session_from_store(self, mocked_request):
+        """Test that aggregated sessions of past days are served from the session store"""
+        # Setup
+        token, _ = get_token()
+        baby_json = json.loads(load_fixture('', 'us_v3_me_baby__get_200.json'))
+        aggregated_session_json = json.loads(load_fixture('', 'ss_v2_sessions_aggregated__get_200.json'))
+        mocked_request.return_value.json = CoroutineMock(
+            side_effect=[baby_json] + [aggregated_session_json] * 5)
+        mocked_request.return_value.status = 200
+        store = AggregatedSessionStore(':memory:')
+        today = datetime.now() - timedelta(hours=1)
+        # Over in UTC, but not yet in timezones far behind UTC
+        yesterday = datetime.utcnow() - timedelta(days=1, hours=6)
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session, session_store=store)
+            # Test
+            first = await snoo.get_aggregated_session(datetime(2021, 2, 2, 7))
+            second = await snoo.get_aggregated_session(datetime(2021, 2, 2, 7))
+            await snoo.get_aggregated_session(today)
+            await snoo.get_aggregated_session(today)
+            await snoo.get_aggregated_session(yesterday)
+            await snoo.get_aggregated_session(yesterday)
+
+            # Check Request: Baby, past day once, today and yesterday twice
+            self.assertEqual(mocked_request.call_count, 6)
+            self.assertEqual(first, second)
+            self.assertEqual(store.get(baby_json['_id'], datetime(2021, 2, 2, 7)), aggregated_session_json)
+            self.assertIsNone(store.get(baby_json['_id'], today))
+            self.assertIsNone(store.get(baby_json['_id'], yesterday))
+
     @patch('aiohttp.client.ClientSession._request')
     async def test_get_aggregated_session_avg(self, mocked_request):
         """Test the successful GET /ss/v2/babies/{}/sessions/aggregated/avg endpoint"""
@@ -380,3 +514,270 @@ class TestSnooClient(TestCase):
 
             # Check Response
             self.assertEqual(baby, Baby.from_dict(baby_json))
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_get_baby_cached(self, mocked_request):
+        """Test that a cached GET /us/v3/me/baby is only requested once within its TTL"""
+        # Setup
+        token, _ = get_token()
+        baby_json = json.loads(load_fixture('', 'us_v3_me_baby__get_200.json'))
+        mocked_request.return_value.json = CoroutineMock(side_effect=[baby_json])
+        mocked_request.return_value.status = 200
+        mocked_request.return_value.headers = {}
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session, cache_ttls=DEFAULT_CACHE_TTLS)
+            # Test
+            baby = await snoo.get_baby()
+            cached_baby = await snoo.get_baby()
+
+            # Check Request
+            mocked_request.assert_called_once()
+            self.assertIs(baby, cached_baby)
+
+            # Cleared cache requests again
+            mocked_request.return_value.json = CoroutineMock(side_effect=[baby_json])
+            snoo.clear_cache()
+            await snoo.get_baby()
+            self.assertEqual(mocked_request.call_count, 2)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_get_devices_revalidate_etag(self, mocked_request):
+        """Test that an expired cached GET /ds/me/devices is revalidated with If-None-Match"""
+        # Setup
+        token, _ = get_token()
+        devices_json = json.loads(load_fixture('', 'ds_me_devices__get_200.json'))
+        mocked_request.return_value.json = CoroutineMock(side_effect=[devices_json])
+        mocked_request.return_value.status = 200
+        mocked_request.return_value.headers = {'ETag': '"ETAG"'}
+
+        async with SnooAuthSession(token) as session:
+            # TTL of 0 always revalidates
+            snoo = Snoo(session, cache_ttls={SNOO_DEVICES_ENDPOINT: 0})
+            # Test
+            devices = await snoo.get_devices()
+            mocked_request.return_value.status = 304
+            revalidated_devices = await snoo.get_devices()
+
+            # Check Request
+            self.assertEqual(mocked_request.call_args_list[1], call(
+                'GET', SNOO_DEVICES_ENDPOINT,
+                data=None,
+                allow_redirects=True,
+                headers={'If-None-Match': '"ETAG"',
+                         'Authorization': 'Bearer {}'.format(token['access_token'])}))
+
+            # Check Response
+            self.assertEqual(devices, revalidated_devices)
+            self.assertEqual(devices, [Device.from_dict(devices_json[0])])
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_set_weaning_updates_cache(self, mocked_request):
+        """Test that a PATCH of /us/v3/me/baby replaces the cached baby"""
+        # Setup
+        token, _ = get_token()
+        baby_json = json.loads(load_fixture('', 'us_v3_me_baby__get_200.json'))
+        patched_baby_json = dict(baby_json, settings=dict(baby_json['settings'], weaning=True))
+        mocked_request.return_value.json = CoroutineMock(side_effect=[baby_json, patched_baby_json])
+        mocked_request.return_value.status = 200
+        mocked_request.return_value.headers = {}
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session, cache_ttls=DEFAULT_CACHE_TTLS)
+            # Test
+            await snoo.get_baby()
+            patched_baby = await snoo.set_weaning(True)
+            cached_baby = await snoo.get_baby()
+
+            # Check
+            self.assertEqual(mocked_request.call_count, 2)
+            self.assertIs(patched_baby, cached_baby)
+            self.assertTrue(cached_baby.settings.weaning)
+
+
+class TestSnooClientErrors(TestCase):
+    """Snoo Client Error Handling Test class"""
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_retry_transient_errors(self, mocked_request):
+        """Test that 502, 429 (with Retry-After) and connection errors are retried"""
+        # Setup
+        token, _ = get_token()
+        user_json = json.loads(load_fixture('', 'us_me__get_200.json'))
+        mocked_request.side_effect = [_response(502),
+                                      _response(429, headers={'Retry-After': '0.01'}),
+                                      aiohttp.ClientConnectionError(),
+                                      _response(200, user_json)]
+        retry_policy = RetryPolicy(backoff_base=0.001, jitter=False)
+
+        async with SnooAuthSession(token, retry_policy=retry_policy) as session:
+            snoo = Snoo(session)
+            # Test
+            user = await snoo.get_me()
+
+            # Check
+            self.assertEqual(mocked_request.call_count, 4)
+            self.assertEqual(user, User.from_dict(user_json))
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_retry_gives_up(self, mocked_request):
+        """Test that the typed error of the last response is raised after max_attempts"""
+        # Setup
+        token, _ = get_token()
+        mocked_request.return_value = _response(503)
+        retry_policy = RetryPolicy(max_attempts=3, backoff_base=0.001)
+
+        async with SnooAuthSession(token, retry_policy=retry_policy) as session:
+            snoo = Snoo(session)
+            # Test
+            with self.assertRaises(SnooServerError) as context:
+                await snoo.get_me()
+
+            # Check
+            self.assertEqual(mocked_request.call_count, 3)
+            self.assertEqual(context.exception.status, 503)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_retry_deadline(self, mocked_request):
+        """Test that a Retry-After beyond the deadline is not waited for"""
+        # Setup
+        token, _ = get_token()
+        mocked_request.return_value = _response(429, headers={'Retry-After': '120'})
+        retry_policy = RetryPolicy(deadline=60)
+
+        async with SnooAuthSession(token, retry_policy=retry_policy) as session:
+            snoo = Snoo(session)
+            # Test
+            with self.assertRaises(SnooRateLimitError) as context:
+                await snoo.get_me()
+
+            # Check
+            mocked_request.assert_called_once()
+            self.assertEqual(context.exception.retry_after, 120)
+            self.assertIsInstance(mocked_request.call_args[1]['timeout'], aiohttp.ClientTimeout)
+            self.assertLessEqual(mocked_request.call_args[1]['timeout'].total, 60)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_retry_after_beyond_backoff_max(self, mocked_request):
+        """Test that a Retry-After above backoff_max raises instead of blocking"""
+        # Setup
+        token, _ = get_token()
+        mocked_request.return_value = _response(429, headers={'Retry-After': '3600'})
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session)
+            # Test
+            with self.assertRaises(SnooRateLimitError) as context:
+                await snoo.get_me()
+
+            # Check
+            mocked_request.assert_called_once()
+            self.assertEqual(context.exception.retry_after, 3600)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_non_idempotent_methods_are_not_retried(self, mocked_request):
+        """Test that a failing PATCH is sent once"""
+        # Setup
+        token, _ = get_token()
+        mocked_request.return_value = _response(503)
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session)
+            # Test
+            with self.assertRaises(SnooServerError):
+                await snoo.set_minimal_level(MinimalLevel.LEVEL1)
+
+            # Check
+            mocked_request.assert_called_once()
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_client_errors_are_not_retried(self, mocked_request):
+        """Test that client errors raise their typed error right away"""
+        # Setup
+        token, _ = get_token()
+        mocked_request.side_effect = [_response(401), _response(404)]
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session)
+            # Test
+            with self.assertRaises(SnooAuthenticationError):
+                await snoo.get_me()
+            with self.assertRaises(SnooApiError) as context:
+                await snoo.get_baby()
+
+            # Check
+            self.assertEqual(mocked_request.call_count, 2)
+            self.assertEqual(context.exception.status, 404)
+
+
+class TestSnooClientSnapshot(TestCase):
+    """Snoo Client Snapshot Test class"""
+
+    def setUp(self):
+        self.responses = {
+            SNOO_ME_ENDPOINT: json.loads(load_fixture('', 'us_me__get_200.json')),
+            SNOO_DEVICES_ENDPOINT: json.loads(load_fixture('', 'ds_me_devices__get_200.json')),
+            SNOO_BABY_ENDPOINT: json.loads(load_fixture('', 'us_v3_me_baby__get_200.json')),
+            SNOO_SESSIONS_LAST_ENDPOINT: json.loads(load_fixture('', 'ss_v2_sessions_last__get_200.json')),
+            SNOO_SESSIONS_TOTAL_TIME_ENDPOINT.format('0123456789abcdef01234569'): json.loads(
+                load_fixture('', 'ss_v2_babies_sessions_total-time__get_200.json')),
+        }
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _request(self, _method, url, **_kwargs):
+        """Answer from self.responses after a short delay, counting concurrent requests"""
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        return _response(200, self.responses[url])
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_snapshot(self, mocked_request):
+        """Test that snapshot requests all endpoints concurrently"""
+        token, _ = get_token()
+        mocked_request.side_effect = self._request
+
+        async with SnooAuthSession(token) as session:
+            snoo = Snoo(session)
+            snapshot = await snoo.snapshot()
+
+            self.assertEqual(mocked_request.call_count, 5)
+            # Only the total time waits for the baby ID.
+            self.assertEqual(self.max_in_flight, 4)
+            self.assertIsInstance(snapshot, Snapshot)
+            self.assertEqual(snapshot.user, User.from_dict(self.responses[SNOO_ME_ENDPOINT]))
+            self.assertEqual(snapshot.devices, [Device.from_dict(device)
+                                                for device in self.responses[SNOO_DEVICES_ENDPOINT]])
+            self.assertEqual(snapshot.baby, Baby.from_dict(self.responses[SNOO_BABY_ENDPOINT]))
+            self.assertEqual(snapshot.last_session,
+                             LastSession.from_dict(self.responses[SNOO_SESSIONS_LAST_ENDPOINT]))
+            self.assertEqual(snapshot.session_total_time, timedelta(seconds=734437))
+            self.assertEqual(snapshot.to_dict()['sessionTotalTime'], '8 days, 12:00:37')
+
+            # The baby ID is known now, all five requests run concurrently.
+            self.max_in_flight = 0
+            await snoo.snapshot()
+            self.assertEqual(self.max_in_flight, 5)
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_snapshot_error(self, mocked_request):
+        """Test that a failing request fails the snapshot and cancels the others"""
+        token, _ = get_token()
+
+        async def request(method, url, **kwargs):
+            if url == SNOO_SESSIONS_LAST_ENDPOINT:
+                return _response(404)
+            return await self._request(method, url, **kwargs)
+        mocked_request.side_effect = request
+
+        async with SnooAuthSession(token) as session:
+            with self.assertRaises(SnooApiError):
+                await Snoo(session).snapshot()
+            # Let the cancellations run
+            await asyncio.sleep(0)
+            self.assertEqual(self.in_flight, 0)
+            self.assertLess(mocked_request.call_count, 5)
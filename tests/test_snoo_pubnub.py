@@ -1,12 +1,16 @@
 """TestClass for the Snoo Pubnub"""
+import asyncio
 import json
 
 from pubnub.enums import PNOperationType, PNStatusCategory
 from pubnub.models.consumer.common import PNStatus
 from pubnub.models.consumer.pubsub import PNMessageResult
+from pubnub.models.consumer.history import PNHistoryResult, PNHistoryItemResult
 
 from asynctest import TestCase, patch, MagicMock
-from pysnoo import SnooPubNub, SessionLevel, ActivityState
+from pysnoo import (SnooPubNub, SessionLevel, ActivityState, LazyActivityState, OverflowPolicy,
+                    DeviceStateCache)
+from pysnoo.models import EventType
 from pysnoo.const import SNOO_PUBNUB_PUBLISH_KEY, SNOO_PUBNUB_SUBSCRIBE_KEY
 
 from tests.helpers import load_fixture
@@ -89,6 +93,54 @@ class TestSnooPubnub(TestCase):
         self.assertEqual(options.query_string,
                          f'auth=ACCESS_TOKEN&pnsdk=PubNub-Python-Asyncio%2F{self.pubnub._pubnub.SDK_VERSION}&uuid=UUID')
 
+    @patch('pubnub.pubnub_asyncio.PubNubAsyncio.request_future')
+    async def test_publish_goto_state_coalesced(self, mocked_request):
+        """Test that coalesced publish_goto_state calls result in a single publish"""
+        results = await asyncio.gather(self.pubnub.publish_goto_state(SessionLevel.LEVEL1, coalesce=True),
+                                       self.pubnub.publish_goto_state(SessionLevel.LEVEL2, coalesce=True))
+
+        mocked_request.assert_called_once()
+        options = mocked_request.mock_calls[0][2]['options_func']()
+        self.assertEqual(options.path, f'/publish/{SNOO_PUBNUB_PUBLISH_KEY}/{SNOO_PUBNUB_SUBSCRIBE_KEY}/0/'
+                                       f'ControlCommand.SERIAL_NUMBER/0/'
+                                       f'%7B%22command%22%3A%20%22go_to_state%22%2C%20%22state%22%3A%20%22LEVEL2%22%7D')
+        self.assertTrue(results[0].superseded)
+        self.assertFalse(results[1].superseded)
+
+    @patch('pubnub.pubnub_asyncio.PubNubAsyncio.request_future')
+    async def test_publish_goto_state_and_wait(self, mocked_request):
+        """Test that publish_goto_state_and_wait resolves with the acknowledging activity state"""
+        # pylint: disable=protected-access
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+
+        def acknowledge(event, state):
+            payload = dict(activity_state_msg_payload, event=event,
+                           state_machine=dict(activity_state_msg_payload['state_machine'], state=state))
+            self.pubnub._listener.message(self.pubnub._pubnub, PNMessageResult(payload, None, None, 0))
+
+        async def publish(*_, **__):
+            # Non matching states
+            self.loop.call_soon(acknowledge, 'activity', 'LEVEL2')
+            self.loop.call_soon(acknowledge, 'command', 'LEVEL1')
+            self.loop.call_later(0.01, acknowledge, 'command', 'LEVEL2')
+
+        mocked_request.side_effect = publish
+
+        state = await self.pubnub.publish_goto_state_and_wait(SessionLevel.LEVEL2)
+
+        mocked_request.assert_called_once()
+        self.assertEqual(state.event, EventType.COMMAND)
+        self.assertEqual(state.state_machine.state, SessionLevel.LEVEL2)
+        self.assertEqual(self.pubnub.ack_tracker.latency.count, 1)
+        self.assertGreaterEqual(self.pubnub.ack_tracker.latency.sum, 0.01)
+
+        mocked_request.side_effect = None
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.pubnub.publish_start_and_wait(timeout=0.01)
+        self.assertEqual(self.pubnub.ack_tracker.timeouts, 1)
+        self.assertEqual(self.pubnub.ack_tracker.latency.count, 1)
+
     @patch('pubnub.managers.SubscriptionManager.adapt_subscribe_builder')
     async def test_subscribe_and_await_connect(self, mocked_subscribe_builder):
         """Test subscribe"""
@@ -171,6 +223,37 @@ class TestSnooPubnub(TestCase):
             options.query_string, f'count={count}&pnsdk=PubNub-Python-Asyncio%2F{self.pubnub._pubnub.SDK_VERSION}&'
                                   f'uuid=UUID&auth=ACCESS_TOKEN')
 
+    @patch('pubnub.pubnub_asyncio.PubNubAsyncio.request_future')
+    async def test_iter_history(self, mocked_request):
+        """Test paginated history"""
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+
+        def envelope(event_times, start_timetoken):
+            result = MagicMock()
+            result.result = PNHistoryResult(
+                [PNHistoryItemResult(dict(activity_state_msg_payload, event_time_ms=event_time), None)
+                 for event_time in event_times], start_timetoken, 0)
+            return result
+
+        mocked_request.side_effect = [envelope([3000, 4000], 30), envelope([1000, 2000], 10), envelope([], 0)]
+
+        states = [state async for state in self.pubnub.iter_history(end=5, page_size=2)]
+
+        self.assertEqual([int(state.event_time.timestamp()) for state in states], [4, 3, 2, 1])
+        self.assertEqual(mocked_request.call_count, 3)
+        queries = []
+        for mock_call in mocked_request.mock_calls:
+            options = mock_call[2]['options_func']()
+            options.merge_params_in({})
+            queries.append(options.query_string)
+        self.assertNotIn('start=', queries[0])
+        self.assertIn('start=30', queries[1])
+        self.assertIn('start=10', queries[2])
+        for query in queries:
+            self.assertIn('count=2', query)
+            self.assertIn('end=5', query)
+
     async def test_message_callback(self):
         """Test listener Callback on Message"""
         # pylint: disable=protected-access
@@ -189,7 +272,139 @@ class TestSnooPubnub(TestCase):
             activity_state_msg_payload, None, None, 0))
 
         callback.assert_called_once_with(activity_state)
+        self.assertIsInstance(callback.call_args[0][0], ActivityState)
 
         # Remove callback
         remove_cb()
         self.assertEqual(self.pubnub._external_listeners, [])
+
+    async def test_message_callback_lazy_decoding(self):
+        """Test listener Callback on Message without eager decoding"""
+        # pylint: disable=protected-access
+        await self.pubnub.stop()
+        self.pubnub = SnooPubNub('ACCESS_TOKEN',
+                                 'SERIAL_NUMBER',
+                                 'UUID',
+                                 custom_event_loop=self.loop,
+                                 eager_decoding=False)
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+
+        callback = MagicMock()
+        self.pubnub.add_listener(callback)
+        self.pubnub._listener.message(self.pubnub._pubnub, PNMessageResult(
+            activity_state_msg_payload, None, None, 0))
+
+        callback.assert_called_once_with(ActivityState.from_dict(activity_state_msg_payload))
+        self.assertIsInstance(callback.call_args[0][0], LazyActivityState)
+
+    @patch('pubnub.pubnub_asyncio.PubNubAsyncio.request_future')
+    async def test_device_state_cache(self, mocked_request):
+        """Test that the device state cache only requests history while cold or stale"""
+        # pylint: disable=protected-access
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+        history_envelope = MagicMock()
+        history_envelope.result = PNHistoryResult(
+            [PNHistoryItemResult(activity_state_msg_payload, None)], 0, 0)
+        mocked_request.return_value = history_envelope
+
+        cache = DeviceStateCache(self.pubnub, max_age=0.05)
+        self.assertIsNone(cache.age)
+
+        # Cold
+        state = await cache.get()
+        self.assertEqual(state, ActivityState.from_dict(activity_state_msg_payload))
+        mocked_request.assert_called_once()
+
+        # Fresh, updated by the subscription
+        newer_payload = dict(activity_state_msg_payload,
+                             event_time_ms=activity_state_msg_payload['event_time_ms'] + 1000)
+        self.pubnub._listener.message(self.pubnub._pubnub, PNMessageResult(newer_payload, None, None, 0))
+        self.assertTrue(cache.is_fresh)
+        self.assertEqual(await cache.get(), ActivityState.from_dict(newer_payload))
+        mocked_request.assert_called_once()
+
+        # Stale, older history does not overwrite the newer state
+        await asyncio.sleep(0.06)
+        self.assertFalse(cache.is_fresh)
+        self.assertEqual(await cache.get(), ActivityState.from_dict(newer_payload))
+        self.assertEqual(mocked_request.call_count, 2)
+
+        cache.invalidate()
+        await cache.get()
+        self.assertEqual(mocked_request.call_count, 3)
+
+        cache.close()
+        self.assertEqual(self.pubnub._external_listeners, [])
+
+    async def test_events(self):
+        """Test the bounded activity state queue with the different overflow policies"""
+        # pylint: disable=protected-access
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+
+        def send(count):
+            for i in range(count):
+                self.pubnub._listener.message(self.pubnub._pubnub, PNMessageResult(
+                    dict(activity_state_msg_payload, event_time_ms=i), None, None, 0))
+
+        async def consume(events):
+            return [int(state.event_time.timestamp() * 1000) async for state in events]
+
+        for overflow, expected, lag in [(OverflowPolicy.DROP_OLDEST, [3, 4], 2),
+                                        (OverflowPolicy.DROP_NEWEST, [0, 1], 2),
+                                        (OverflowPolicy.BLOCK, [0, 1, 2, 3, 4], 5)]:
+            async with self.pubnub.events(maxsize=2, overflow=overflow) as events:
+                send(5)
+                # Let blocked puts wait for room
+                await asyncio.sleep(0)
+                self.assertEqual(events.received, 5)
+                self.assertEqual(events.lag, lag)
+                self.assertEqual(events.dropped, 5 - len(expected))
+                consumer = asyncio.ensure_future(consume(events))
+                await asyncio.sleep(0.01)
+            self.assertEqual(await consumer, expected, overflow)
+            self.assertEqual(self.pubnub._external_listeners, [])
+
+    async def test_events_close_with_pending_puts(self):
+        """Test that closing a full queue with pending puts keeps all queued states"""
+        # pylint: disable=protected-access
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+
+        for overflow, expected in [(OverflowPolicy.DROP_OLDEST, [3, 4]),
+                                   (OverflowPolicy.DROP_NEWEST, [0, 1]),
+                                   (OverflowPolicy.BLOCK, [0, 1, 2, 3, 4])]:
+            events = self.pubnub.events(maxsize=2, overflow=overflow)
+            for i in range(5):
+                self.pubnub._listener.message(self.pubnub._pubnub, PNMessageResult(
+                    dict(activity_state_msg_payload, event_time_ms=i), None, None, 0))
+            # Close before the blocked puts started waiting
+            events.close()
+
+            received = [int(state.event_time.timestamp() * 1000) async for state in events]
+            self.assertEqual(received, expected, overflow)
+            self.assertEqual(events.dropped, 5 - len(expected), overflow)
+            self.assertEqual(events.lag, 0, overflow)
+
+    async def test_events_block_max_pending(self):
+        """Test that a blocking queue drops states beyond max_pending"""
+        # pylint: disable=protected-access
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+
+        events = self.pubnub.events(maxsize=2, overflow=OverflowPolicy.BLOCK, max_pending=2)
+        with self.assertLogs('pysnoo.pubnub', 'WARNING') as logs:
+            for i in range(7):
+                self.pubnub._listener.message(self.pubnub._pubnub, PNMessageResult(
+                    dict(activity_state_msg_payload, event_time_ms=i), None, None, 0))
+        # Logged once per overload
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(events.lag, 4)
+        self.assertEqual(events.dropped, 3)
+        events.close()
+
+        received = [int(state.event_time.timestamp() * 1000) async for state in events]
+        self.assertEqual(received, [0, 1, 2, 3])
+        self.assertEqual(events.lag, 0)
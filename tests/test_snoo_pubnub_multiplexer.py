@@ -0,0 +1,70 @@
+"""TestClass for the Snoo PubNub Multiplexer"""
+import json
+
+from pubnub.enums import PNStatusCategory
+from pubnub.models.consumer.common import PNStatus
+from pubnub.models.consumer.pubsub import PNMessageResult
+
+from asynctest import TestCase, patch, MagicMock
+from pysnoo import SnooPubNubMultiplexer, ActivityState
+
+from tests.helpers import load_fixture
+
+
+class TestSnooPubNubMultiplexer(TestCase):
+    """Snoo PubNub Multiplexer class"""
+
+    def setUp(self):
+        self.multiplexer = SnooPubNubMultiplexer('ACCESS_TOKEN',
+                                                 'UUID',
+                                                 custom_event_loop=self.loop)
+
+    async def tearDown(self):
+        # pylint: disable=invalid-overridden-method
+        await self.multiplexer.stop()
+
+    @patch('pubnub.managers.SubscriptionManager.adapt_subscribe_builder')
+    async def test_subscribe_and_await_connect(self, mocked_subscribe_builder):
+        """Test that all devices are subscribed with one subscription"""
+        # pylint: disable=protected-access
+        self.multiplexer.add_device('SERIAL_1')
+        self.multiplexer.add_listener('SERIAL_2', MagicMock())
+        pn_status = PNStatus()
+        pn_status.category = PNStatusCategory.PNConnectedCategory
+        self.loop.call_later(0.1, self.multiplexer._listener.status,
+                             self.multiplexer._pubnub, pn_status)
+
+        await self.multiplexer.subscribe_and_await_connect()
+
+        mocked_subscribe_builder.assert_called_once()
+        subscribe_operation = mocked_subscribe_builder.mock_calls[0][1][0]
+        self.assertEqual(subscribe_operation.channels, ['ActivityState.SERIAL_1', 'ActivityState.SERIAL_2'])
+        self.assertEqual(self.multiplexer.serial_numbers, ['SERIAL_1', 'SERIAL_2'])
+
+        # Devices added later are subscribed right away.
+        self.multiplexer.add_device('SERIAL_3')
+        self.assertEqual(mocked_subscribe_builder.call_count, 2)
+        self.assertEqual(mocked_subscribe_builder.mock_calls[1][1][0].channels, ['ActivityState.SERIAL_3'])
+
+    async def test_message_routing(self):
+        """Test that messages are routed to the listeners of their device"""
+        # pylint: disable=protected-access
+        activity_state_msg_payload = json.loads(
+            load_fixture('', 'pubnub_message_ActivityState.json'))
+
+        callback_1 = MagicMock()
+        callback_2 = MagicMock()
+        remove_cb = self.multiplexer.add_listener('SERIAL_1', callback_1)
+        self.multiplexer.add_listener('SERIAL_2', callback_2)
+
+        self.multiplexer._listener.message(self.multiplexer._pubnub, PNMessageResult(
+            activity_state_msg_payload, None, 'ActivityState.SERIAL_1', 0))
+
+        callback_1.assert_called_once_with(ActivityState.from_dict(activity_state_msg_payload))
+        callback_2.assert_not_called()
+
+        # Remove callback
+        remove_cb()
+        self.multiplexer._listener.message(self.multiplexer._pubnub, PNMessageResult(
+            activity_state_msg_payload, None, 'ActivityState.SERIAL_1', 0))
+        callback_1.assert_called_once()
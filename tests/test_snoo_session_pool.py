@@ -0,0 +1,67 @@
+"""TestClass for the SnooAuthSessionPool"""
+import aiohttp
+from asynctest import TestCase, patch, CoroutineMock, MagicMock
+
+from pysnoo import SnooAuthSessionPool, Snoo, User, ConnectorConfig
+from pysnoo.const import SNOO_ME_ENDPOINT
+
+from tests.helpers import get_token
+
+
+class TestSnooAuthSessionPool(TestCase):
+    """SnooAuthSessionPool Test class"""
+
+    async def test_sessions_share_connector(self):
+        """Test that all account sessions share the connector of the pool"""
+        token, _ = get_token()
+        async with SnooAuthSessionPool() as pool:
+            session_a = await pool.add_account('a', token)
+            session_b = await pool.add_account('b', token)
+
+            self.assertIs(session_a.connector, pool.connector)
+            self.assertIs(session_b.connector, pool.connector)
+            self.assertEqual(len(pool), 2)
+            self.assertIs(pool['a'], session_a)
+
+            with self.assertRaises(ValueError):
+                await pool.add_account('a', token)
+
+            # Removing an account closes its session, but not the shared connector.
+            await pool.remove_account('a')
+            self.assertTrue(session_a.closed)
+            self.assertFalse(pool.connector.closed)
+            self.assertNotIn('a', pool)
+
+            connector = pool.connector
+
+        self.assertTrue(session_b.closed)
+        self.assertTrue(connector.closed)
+
+    async def test_connector_config(self):
+        """Test that the pool creates its connector according to connector_config"""
+        async with SnooAuthSessionPool(connector_config=ConnectorConfig(limit_per_host=8)) as pool:
+            self.assertIsInstance(pool.connector, aiohttp.TCPConnector)
+            self.assertEqual(pool.connector.limit_per_host, 8)
+
+        with self.assertRaises(ValueError):
+            SnooAuthSessionPool(connector=MagicMock(), connector_config=ConnectorConfig())
+
+    @patch('aiohttp.client.ClientSession._request')
+    async def test_per_account_token(self, mocked_request):
+        """Test that every account keeps its own token"""
+        token_a, _ = get_token()
+        token_b = dict(token_a, access_token='OTHER_JWT_TOKEN')
+        mocked_request.return_value.json = CoroutineMock(return_value={})
+        mocked_request.return_value.status = 200
+
+        async with SnooAuthSessionPool() as pool:
+            await pool.add_account('a', token_a, MagicMock())
+            await pool.add_account('b', token_b, MagicMock())
+
+            self.assertIsInstance(await Snoo(pool['b']).get_me(), User)
+
+        mocked_request.assert_called_once_with(
+            'GET', SNOO_ME_ENDPOINT,
+            data=None,
+            allow_redirects=True,
+            headers={'Authorization': 'Bearer OTHER_JWT_TOKEN'})